@@ -0,0 +1,299 @@
+"""Нагрузочный прогон контроллеров бота.
+
+N виртуальных пользователей одновременно выполняют типичный сценарий
+(старт/стоп/плюс/статистика/отчёт) через настоящие TimerController,
+ReportController и StatisticsController. База - временный SQLite файл,
+Битрикс - локальный stub-сервер, Telegram - фейковые Update/Context.
+
+Запуск из корня проекта:
+    python Benchmarks/benchmark.py --users 50 --actions 40
+    python Benchmarks/benchmark.py --compare Benchmarks/results/<прошлый>.json
+
+Результат (p50/p95/p99 задержки обработчика, запросы к БД на действие по
+Class.QueryLog, пропускная способность, самые тяжёлые запросы) сохраняется в Benchmarks/results/<время>-<коммит>.json.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'Benchmarks', 'results')
+sys.path.insert(0, ROOT)
+
+# Доля действий в сценарии пользователя
+ACTION_WEIGHTS = {'start': 30, 'stop': 30, 'plus': 15, 'stats': 10, 'week': 5, 'report': 10}
+
+class StubB24Handler(BaseHTTPRequestHandler):
+    """REST Битрикса: batch и одиночные вызовы всегда успешны"""
+    next_id = 1000
+    delay = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.path.endswith('/batch'):
+            result = {}
+            for key, command in body['cmd'].items():
+                StubB24Handler.next_id += 1
+                result[key] = StubB24Handler.next_id if '.add?' in command else True
+            payload = {'result': {'result': result, 'result_error': []}}
+        else:
+            StubB24Handler.next_id += 1
+            payload = {'result': StubB24Handler.next_id}
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class FakeBot:
+    async def send_message(self, chat_id, text, **kwargs):
+        return None
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return None
+
+class FakeMessage:
+    def __init__(self, text, replies, bot, chat_id):
+        self.text = text
+        self.chat_id = chat_id
+        self.message_id = len(replies)
+        self._replies = replies
+        self._bot = bot
+
+    def get_bot(self):
+        return self._bot
+
+    async def reply_text(self, text, **kwargs):
+        self._replies.append(text)
+        return FakeMessage(text, self._replies, self._bot, self.chat_id)
+
+class VirtualUser:
+    """Пользователь со своим состоянием диалога (context.user_data) и таймерами"""
+
+    def __init__(self, user_id, timers, rng):
+        self.user_id = user_id
+        self.timers = timers
+        self.rng = rng
+        self.running = None
+        self.user_data = {}
+        self.replies = []
+        self.bot = FakeBot()
+
+    def update(self, text):
+        return SimpleNamespace(
+            effective_user=SimpleNamespace(id=self.user_id),
+            effective_chat=SimpleNamespace(id=self.user_id),
+            message=FakeMessage(text, self.replies, self.bot, self.user_id),
+        )
+
+    def context(self, args=None):
+        return SimpleNamespace(args=args or [], user_data=self.user_data, job_queue=None, bot=self.bot)
+
+    def next_action(self):
+        action = self.rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        # Стоп без запущенного таймера и старт при запущенном - бессмысленные нажатия, заменяем
+        if action == 'stop' and not self.running:
+            return 'start'
+        if action == 'start' and self.running:
+            return 'stop'
+        return action
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return 'unknown'
+
+class Benchmark:
+    def __init__(self, users, actions, seed, b24_delay):
+        self.users_count = users
+        self.actions = actions
+        self.seed = seed
+        self.b24_delay = b24_delay
+        self.samples = {}  # действие -> [(секунды, запросов к БД)]
+
+    def _setup_environment(self, workdir):
+        StubB24Handler.delay = self.b24_delay
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubB24Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        # Модели открывают timers.db относительно текущего каталога
+        os.chdir(workdir)
+        os.environ.update({
+            'B24_BASE_URL': f'http://127.0.0.1:{server.server_port}',
+            'CRM_TOKEN': 'benchmark',
+            'CRM_REFRESH': 'benchmark',
+            'CRM_TOKEN_EXPIRES': str(time.time() + 86400),
+        })
+        return server
+
+    async def _measure(self, action, handler, update, context):
+        from Class.QueryLog import query_log
+        started = time.perf_counter()
+        with query_log.action(action) as stats:
+            await handler(update, context)
+        elapsed = time.perf_counter() - started
+        self.samples.setdefault(action, []).append((elapsed, stats.queries))
+
+    async def _run_user(self, user, controllers):
+        timer_controller, report_controller, statistics_controller = controllers
+        for name in user.timers:
+            await self._measure('new', timer_controller.create_timer, user.update('/new'),
+                                user.context([name, str(user.rng.randint(1, 9999)), str(user.rng.choice([1, 2, 3]))]))
+
+        for _ in range(self.actions):
+            action = user.next_action()
+            if action == 'start':
+                name = user.rng.choice(user.timers)
+                await self._measure(action, timer_controller.start_timer, user.update(f"▶️ Старт {name}"), user.context())
+                user.running = name
+            elif action == 'stop':
+                await self._measure(action, timer_controller.stop_timer, user.update(f"⏹️ Стоп {user.running}"), user.context())
+                user.running = None
+            elif action == 'plus':
+                name = user.rng.choice(user.timers)
+                await self._measure(action, timer_controller.add_minutes, user.update('/plus'),
+                                    user.context([name, str(user.rng.randint(5, 60))]))
+            elif action == 'stats':
+                await self._measure(action, timer_controller.show_statistics, user.update("📊 Статистика"), user.context())
+            elif action == 'week':
+                await self._measure(action, statistics_controller.week, user.update('/week'), user.context())
+            elif action == 'report':
+                await self._measure(action, report_controller.generate_report, user.update("Отчёт"), user.context())
+
+    async def _run(self):
+        from Controllers.TimerController import TimerController
+        from Controllers.ReportController import ReportController
+        from Controllers.StatisticsController import StatisticsController
+        from Model.User import User
+        from Services.B24Service import B24Service
+        from Class.QueryLog import query_log
+
+        user_model = User.instance()
+        rng = random.Random(self.seed)
+        users = []
+        for index in range(self.users_count):
+            user_id = 100000 + index
+            user_model.create_user(user_id, 500 + index, f'user{index}')
+            timers = [f'task{number}' for number in range(rng.randint(2, 6))]
+            users.append(VirtualUser(user_id, timers, random.Random(rng.random())))
+
+        controllers = (TimerController(), ReportController(), StatisticsController())
+        started = time.perf_counter()
+        await asyncio.gather(*[self._run_user(user, controllers) for user in users])
+        wall = time.perf_counter() - started
+        await B24Service.close()
+        return wall, query_log.top(5)
+
+    def run(self):
+        with tempfile.TemporaryDirectory(prefix='tasktreker-bench-') as workdir:
+            cwd = os.getcwd()
+            server = self._setup_environment(workdir)
+            try:
+                wall, top_queries = asyncio.run(self._run())
+            finally:
+                server.shutdown()
+                os.chdir(cwd)
+        return self._report(wall, top_queries)
+
+    def _report(self, wall, top_queries):
+        actions = {}
+        total = 0
+        for action, samples in sorted(self.samples.items()):
+            latencies = [elapsed * 1000 for elapsed, _ in samples]
+            queries = [count for _, count in samples]
+            total += len(samples)
+            actions[action] = {
+                'count': len(samples),
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'mean_ms': round(sum(latencies) / len(latencies), 3),
+                'queries_per_action': round(sum(queries) / len(queries), 2),
+            }
+        return {
+            'commit': git_commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'params': {'users': self.users_count, 'actions': self.actions, 'seed': self.seed, 'b24_delay': self.b24_delay},
+            'wall_seconds': round(wall, 3),
+            'throughput_per_second': round(total / wall, 1),
+            'actions': actions,
+            'top_queries': [
+                {'query': fingerprint, 'calls': stat['calls'], 'total_ms': round(stat['total_ms'], 3),
+                 'max_ms': round(stat['max_ms'], 3), 'callers': stat['callers']}
+                for fingerprint, stat in top_queries
+            ],
+        }
+
+def print_report(result, baseline=None):
+    print(f"Коммит {result['commit']}, {result['params']['users']} пользователей x {result['params']['actions']} действий")
+    print(f"{'действие':<8} {'кол-во':>7} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'запросов':>9}")
+    for action, stats in result['actions'].items():
+        line = (f"{action:<8} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['p99_ms']:>9.2f} {stats['queries_per_action']:>9.2f}")
+        previous = (baseline or {}).get('actions', {}).get(action)
+        if previous:
+            change = (stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100 if previous['p95_ms'] else 0
+            line += f"   p95 {change:+.0f}%, запросов {stats['queries_per_action'] - previous['queries_per_action']:+.2f}"
+        print(line)
+    print(f"Пропускная способность: {result['throughput_per_second']} действий/с за {result['wall_seconds']} с")
+    print("Самые тяжёлые запросы:")
+    for query in result['top_queries']:
+        print(f"  {query['total_ms']:>9.1f} мс, {query['calls']:>5} раз: {query['query'][:100]}")
+    if baseline:
+        print(f"Сравнение с {baseline['commit']} ({baseline['date']}): "
+              f"{baseline['throughput_per_second']} действий/с")
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон контроллеров бота')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--actions', type=int, default=30, help='действий на пользователя')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--b24-delay', type=float, default=0.0, help='задержка ответа stub Битрикса, с')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    result = Benchmark(args.users, args.actions, args.seed, args.b24_delay).run()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+    print_report(result, baseline)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{result['commit']}.json")
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        print(f"Результат сохранён: {path}")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -4,16 +4,16 @@ from Services.TimerService import TimerService
 
 class Controller:
     def __init__(self):
-        self.timer_service = TimerService()
+        self.timer_service = TimerService.instance()
     
     def get_user_id(self, update: Update):
         """Получение ID пользователя"""
         return update.effective_user.id
     
-    async def send_response(self, update: Update, message: str):
-        """Отправка ответа с клавиатурой"""
+    async def send_response(self, update: Update, message: str, force_keyboard: bool = False):
+        """Отправка ответа с клавиатурой (без неё, если клавиатура не изменилась)"""
         user_id = self.get_user_id(update)
         await update.message.reply_text(
             message,
-            reply_markup=self.timer_service.get_reply_keyboard(user_id)
+            reply_markup=await self.timer_service.get_reply_keyboard(user_id, only_changed=not force_keyboard)
         )
\ No newline at end of file
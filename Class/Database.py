@@ -0,0 +1,185 @@
+import contextvars
+import os
+import sqlite3
+import threading
+from Class.Executor import db_executor
+
+class Transaction:
+    """Транзакция на выделенном соединении: `with` в синхронном коде, `async with` в асинхронном.
+
+    Пока транзакция открыта, все запросы моделей в том же контексте (в том числе
+    выполняемые через db_executor) идут через её соединение, а фиксация одна на всех.
+    Вложенная транзакция становится точкой сохранения (SAVEPOINT). Внутри
+    транзакции запросы выполняются последовательно - без asyncio.gather.
+    """
+
+    _current = contextvars.ContextVar('db_transaction', default=None)
+
+    def __init__(self, database: "Database"):
+        self.database = database
+        self.conn = None
+        self.savepoint = None
+        self.depth = 0
+        self._rollback_only = False
+        self._token = None
+
+    def rollback(self):
+        """Откатить транзакцию при выходе из блока без исключения"""
+        self._rollback_only = True
+
+    def _begin(self):
+        parent = Transaction._current.get()
+        if parent is not None and parent.database is self.database:
+            self.conn = parent.conn
+            self.depth = parent.depth + 1
+            self.savepoint = f'sp_{self.depth}'
+        else:
+            self.conn = self.database.acquire()
+        self._token = Transaction._current.set(self)
+
+    def _begin_sql(self):
+        self.conn.execute(f'SAVEPOINT {self.savepoint}' if self.savepoint else 'BEGIN IMMEDIATE')
+
+    def _end_sql(self, failed: bool):
+        failed = failed or self._rollback_only
+        if self.savepoint:
+            if failed:
+                self.conn.execute(f'ROLLBACK TO {self.savepoint}')
+            self.conn.execute(f'RELEASE {self.savepoint}')
+        elif failed:
+            # SQLite мог уже откатить транзакцию сам (например, при SQLITE_FULL)
+            if self.conn.in_transaction:
+                self.conn.execute('ROLLBACK')
+        else:
+            self.conn.execute('COMMIT')
+
+    def _finish(self):
+        Transaction._current.reset(self._token)
+        if not self.savepoint:
+            self.database.release(self.conn)
+
+    def __enter__(self):
+        self._begin()
+        try:
+            self._begin_sql()
+        except Exception:
+            self._finish()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._end_sql(exc_type is not None)
+        finally:
+            self._finish()
+        return False
+
+    async def __aenter__(self):
+        self._begin()
+        try:
+            await db_executor.run(self._begin_sql)
+        except Exception:
+            self._finish()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            await db_executor.run(self._end_sql, exc_type is not None)
+        finally:
+            self._finish()
+        return False
+
+class Database:
+    """Менеджер долгоживущих соединений с SQLite (одно соединение на поток)"""
+
+    _lock = threading.Lock()
+    _instances = {}
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.busy_timeout = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+        self.synchronous = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+        self.cached_statements = int(os.getenv('DB_CACHED_STATEMENTS', 256))
+        self.pool_size = int(os.getenv('DB_POOL_SIZE', 4))
+        # Архив старой истории (см. RetentionService) рядом с основной базой
+        self.archive_path = os.getenv('ARCHIVE_DB') or f'{os.path.splitext(db_path)[0]}_archive.db'
+        self._local = threading.local()
+        self._connections = []
+        self._idle = []
+
+    @classmethod
+    def get(cls, db_path: str = "timers.db") -> "Database":
+        """Получение общего менеджера для файла базы данных"""
+        key = os.path.abspath(db_path)
+        with cls._lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(db_path)
+            return cls._instances[key]
+
+    def _open(self) -> sqlite3.Connection:
+        """Открытие и настройка нового соединения"""
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,  # autocommit, транзакции открываем явно
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        # auto_vacuum задаётся один раз, пока файл базы пуст: до перевода в WAL, который
+        # записывает заголовок. Существующую базу переводит RetentionService (полным VACUUM)
+        if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout}')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        # Архив доступен в любом запросе как archive.<таблица>
+        conn.execute('ATTACH DATABASE ? AS archive', [self.archive_path])
+        conn.execute('PRAGMA archive.journal_mode=WAL')
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Соединение открытой транзакции или соединение текущего потока"""
+        transaction = Transaction._current.get()
+        if transaction is not None and transaction.database is self:
+            return transaction.conn
+        
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Выделенное соединение для транзакции: не делится с другими запросами потока"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._open()
+
+    def release(self, conn: sqlite3.Connection):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+            self._connections.remove(conn)
+        conn.close()
+
+    def transaction(self) -> Transaction:
+        return Transaction(self)
+
+    def close_all(self):
+        """Закрытие всех открытых соединений (при остановке бота) с переносом WAL в файл базы"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._idle = []
+        if connections:
+            try:
+                connections[0].execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except sqlite3.Error as e:
+                print(f"⚠️ Не удалось перенести WAL в {self.db_path}: {e}")
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
\ No newline at end of file
@@ -0,0 +1,41 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class Executor:
+    """Ограниченный пул потоков для блокирующего ввода-вывода вне event loop.
+
+    Пул создаётся при первом вызове: размер из переменной окружения читается
+    уже после загрузки .env, а не при импорте модуля.
+    """
+
+    def __init__(self, name: str, workers_env: str, default_workers: int):
+        self.name = name
+        self.workers_env = workers_env
+        self.default_workers = default_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    max_workers = int(os.getenv(self.workers_env, self.default_workers))
+                    self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self.name)
+        return self._pool
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнение блокирующего вызова в пуле (контекстные переменные сохраняются)"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await loop.run_in_executor(self.pool, call)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+db_executor = Executor('db', 'DB_WORKERS', 4)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import asyncio
+
+class HttpServer:
+    """Минимальный HTTP/1.1 сервер на asyncio для служебных эндпоинтов бота.
+
+    Маршрут - пара (метод, путь) и async обработчик handler(headers, body),
+    который возвращает (статус, content-type, тело в байтах). Тело принимается
+    только с Content-Length; медленные клиенты отключаются по таймаутам.
+    """
+    MAX_BODY = 1024 * 1024
+    MAX_LINE = 8 * 1024  # строка запроса или заголовка
+    MAX_HEADERS = 100
+    IDLE_TIMEOUT = 60  # ожидание следующего запроса в keep-alive соединении, с
+    HEADER_TIMEOUT = 10  # заголовки запроса целиком, с
+    BODY_TIMEOUT = 30  # тело запроса целиком, с
+    REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+               405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large',
+               431: 'Request Header Fields Too Large', 500: 'Internal Server Error',
+               503: 'Service Unavailable'}
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._routes = {}
+        self._server = None
+
+    def route(self, method: str, path: str, handler):
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        # limit - предел длины строки для readline (длинная строка - ValueError)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=self.MAX_LINE)
+        # При port=0 порт выбирает система
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            # Keep-alive: обслуживаем запросы, пока клиент держит соединение
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), self.IDLE_TIMEOUT)
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = await asyncio.wait_for(self._read_headers(reader), self.HEADER_TIMEOUT)
+                if headers is None:
+                    await self._respond(writer, 431, 'text/plain', b'too many headers', keep_alive=False)
+                    break
+                if 'transfer-encoding' in headers:
+                    # Chunked тело не поддерживается: клиенты бота (Telegram, Prometheus) шлют Content-Length
+                    await self._respond(writer, 411, 'text/plain', b'length required', keep_alive=False)
+                    break
+
+                length = int(headers.get('content-length') or 0)
+                if length < 0:
+                    await self._respond(writer, 400, 'text/plain', b'bad request', keep_alive=False)
+                    break
+                if length > self.MAX_BODY:
+                    await self._respond(writer, 413, 'text/plain', b'too large', keep_alive=False)
+                    break
+                body = await asyncio.wait_for(reader.readexactly(length), self.BODY_TIMEOUT) if length else b''
+
+                status, content_type, payload = await self._dispatch(method.upper(), target.split('?', 1)[0], headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_headers(self, reader):
+        """Заголовки запроса (имена в нижнем регистре), None - если их больше MAX_HEADERS"""
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            if len(headers) >= self.MAX_HEADERS:
+                return None
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    async def _dispatch(self, method, path, headers, body):
+        handler = self._routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self._routes):
+                return 405, 'text/plain', b'method not allowed'
+            return 404, 'text/plain', b'not found'
+        try:
+            return await handler(headers, body)
+        except Exception as e:
+            print(f"❌ Ошибка обработки HTTP запроса {method} {path}: {e}")
+            return 500, 'text/plain', b'internal error'
+
+    async def _respond(self, writer, status, content_type, payload, keep_alive=True):
+        head = (
+            f"HTTP/1.1 {status} {self.REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
\ No newline at end of file
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+from telegram.error import BadRequest
+
+class LiveMessage:
+    """Одно сообщение Telegram, которое редактируется по ходу долгой операции.
+
+    Текст собирается из именованных разделов (например, ход отчёта и итог
+    отправки в Битрикс), каждый раздел обновляет свой владелец. Правки идут не
+    чаще раза в interval секунд: промежуточные состояния схлопываются в последнее.
+    """
+
+    def __init__(self, bot, chat_id: int, message_id: int, interval: float = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval if interval is not None else float(os.getenv('LIVE_MESSAGE_INTERVAL', 1.5))
+        self.sections = {}
+        self.text = None  # текст, который сейчас в Telegram
+        self.edits = 0
+        self._last_edit = 0.0
+        self._flush_task = None
+
+    @classmethod
+    async def send(cls, message, section: str, text: str, interval: float = None) -> "LiveMessage":
+        """Отправка ответа на message (первый раздел - section), который дальше будет редактироваться"""
+        sent = await message.reply_text(text)
+        live = cls(message.get_bot(), sent.chat_id, sent.message_id, interval)
+        live.sections[section] = live.text = text
+        live._last_edit = time.monotonic()
+        return live
+
+    def render(self) -> str:
+        return "\n\n".join(text for text in self.sections.values() if text)
+
+    def set(self, section: str, text: str):
+        """Новый текст раздела; правка сообщения - по расписанию троттлинга"""
+        self.sections[section] = text
+        if self._flush_task is None or self._flush_task.done():
+            delay = max(0.0, self._last_edit + self.interval - time.monotonic())
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later(delay))
+
+    async def flush(self):
+        """Немедленная правка (итоговый текст), отложенная правка отменяется"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._edit()
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        # Разделы могли измениться, пока шла правка - тогда ещё одна через interval
+        while await self._edit() and self.render() != self.text:
+            await asyncio.sleep(self.interval)
+
+    async def _edit(self) -> bool:
+        text = self.render()
+        if not text or text == self.text:
+            return True
+        self._last_edit = time.monotonic()
+        try:
+            await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+        except BadRequest as e:
+            # Сообщение могли удалить, или текст совпал с уже показанным
+            if 'not modified' not in str(e).lower():
+                print(f"⚠️ Не удалось обновить сообщение {self.message_id}: {e}")
+                return False
+        except Exception as e:
+            print(f"⚠️ Не удалось обновить сообщение {self.message_id}: {e}")
+            return False
+        self.text = text
+        self.edits += 1
+        return True
\ No newline at end of file
@@ -0,0 +1,135 @@
+import threading
+
+class Metric:
+    """Базовая метрика: значения по наборам меток"""
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labels, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        escaped = [
+            (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in pairs
+        ]
+        return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._format_labels(key), value) for key, value in self._values.items()]
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Значение на момент чтения; callback вызывается при каждом сборе метрик"""
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, labels=(), callback=None):
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.callback is not None:
+            # callback возвращает число или {значение метки: число} для единственной метки
+            try:
+                values = self.callback()
+            except Exception as e:
+                print(f"⚠️ Не удалось собрать метрику {self.name}: {e}")
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+            with self._lock:
+                self._values = {key if isinstance(key, tuple) else (str(key),): value for key, value in values.items()}
+        return super().samples()
+
+class Histogram(Metric):
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        result = []
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                result.append((f'{self.name}_bucket', self._format_labels(key, ('le', repr(float(bound)))), cumulative))
+            result.append((f'{self.name}_bucket', self._format_labels(key, ('le', '+Inf')), count))
+            result.append((f'{self.name}_sum', self._format_labels(key), total))
+            result.append((f'{self.name}_count', self._format_labels(key), count))
+        return result
+
+class MetricsRegistry:
+    """Реестр метрик процесса с выводом в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels=(), callback=None) -> Gauge:
+        return self._get(Gauge, name, help, labels, callback)
+
+    def histogram(self, name: str, help: str, labels=(), buckets=Histogram.DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (callback-метрики могут обращаться к БД - не из event loop)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
\ No newline at end of file
@@ -1,33 +1,112 @@
 import sqlite3
+import time
 from typing import List, Dict, Any, Optional
+from Class.Database import Database, Transaction
+from Class.Executor import db_executor
+from Class.Metrics import metrics
+from Class.QueryLog import query_log
+from Class.Schema import Schema
+from Class.Singleton import Singleton
 
-class Model:
+QUERY_SECONDS = metrics.histogram(
+    'tasktreker_db_query_seconds', 'Время выполнения запросов моделей', ('table', 'operation')
+)
+
+class Model(Singleton):
     def __init__(self, db_path: str = "timers.db", table_name: str = None):
         self.db_path = db_path
         self.table_name = table_name
-        self._initTable()
+        self.database = Database.get(db_path)
+        # Схема создаётся миграциями один раз на процесс, а не при каждом создании модели
+        Schema.bootstrap(db_path)
     
     def _connect(self):
-        """Создание соединения с базой данных"""
-        return sqlite3.connect(self.db_path)
+        """Долгоживущее соединение с базой данных из общего менеджера"""
+        return self.database.connection()
+    
+    def transaction(self) -> Transaction:
+        """Единица работы: `with model.transaction():` или `async with model.transaction():`"""
+        return self.database.transaction()
+    
+    def _execute(self, query: str, params: List[Any] = None) -> sqlite3.Cursor:
+        """Выполнение запроса (prepared statement берётся из кэша соединения)"""
+        conn = self._connect()
+        started = time.perf_counter()
+        cursor = conn.execute(query, params or [])
+        self._record(conn, query, params, started, cursor.rowcount)
+        return cursor
+    
+    def _fetch_all(self, query: str, params: List[Any] = None) -> List[sqlite3.Row]:
+        """Выполнение запроса с чтением всех строк (время и число строк учитываются целиком)"""
+        conn = self._connect()
+        started = time.perf_counter()
+        cursor = conn.execute(query, params or [])
+        # Строки возвращают SELECT и запросы с RETURNING
+        rows = cursor.fetchall() if cursor.description is not None else []
+        self._record(conn, query, params, started, len(rows) if cursor.description is not None else cursor.rowcount)
+        return rows
+    
+    def _record(self, conn, query: str, params, started: float, rows: int):
+        """Учёт запроса в журнале запросов и метриках"""
+        elapsed = time.perf_counter() - started
+        query_log.record(conn, query, params, elapsed, rows)
+        QUERY_SECONDS.observe(elapsed, table=self.table_name, operation=query.lstrip().split(None, 1)[0].upper())
     
     def tableSchema(self):
         return []
     
-    def _initTable(self):
+    def tableIndexes(self):
+        """Индексы таблицы: список пар (имя индекса, определение)"""
+        return []
+    
+    def _columns(self, database: str = 'main') -> List[str]:
+        """Список колонок таблицы в базе данных"""
+        return [row['name'] for row in self._execute(f'PRAGMA {database}.table_info({self.table_name})')]
+    
+    def createTable(self, database: str = 'main'):
         # НЕ используйте параметризацию для имен таблиц и столбцов
         schema = ",\n                    ".join(self.tableSchema())
         create_query = f'''
-            CREATE TABLE IF NOT EXISTS {self.table_name} (
+            CREATE TABLE IF NOT EXISTS {database}.{self.table_name} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 {schema}
             )
         '''
         
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute(create_query)
-            conn.commit()
+        self._execute(create_query)
+    
+    def createIndexes(self, database: str = 'main'):
+        for index_name, definition in self.tableIndexes():
+            self._execute(f'CREATE INDEX IF NOT EXISTS {database}.{index_name} ON {self.table_name} {definition}')
+    
+    def addColumn(self, definition: str, database: str = 'main') -> bool:
+        """Добавление колонки, если её ещё нет (для миграций)"""
+        if definition.split()[0] in self._columns(database):
+            return False
+        self._execute(f'ALTER TABLE {database}.{self.table_name} ADD COLUMN {definition}')
+        return True
+    
+    def archive(self, condition: str, params: List[Any] = None, limit: int = 1000) -> int:
+        """Перенос пачки записей, подходящих под условие, в archive.<таблица>.
+        
+        Строки копируются с теми же id и удаляются из основной базы в одной
+        транзакции. Повторный перенос тех же id перезаписывает копию в архиве.
+        Возвращает число перенесённых записей.
+        """
+        if not self.table_name:
+            raise ValueError("Table name not specified")
+        
+        columns = ', '.join(self._columns())
+        selected = f'SELECT id FROM main.{self.table_name} WHERE {condition} ORDER BY id LIMIT ?'
+        params = list(params or []) + [limit]
+        
+        with self.transaction():
+            self._execute(
+                f'INSERT OR REPLACE INTO archive.{self.table_name} ({columns}) '
+                f'SELECT {columns} FROM main.{self.table_name} WHERE id IN ({selected})',
+                params
+            )
+            return self._execute(f'DELETE FROM main.{self.table_name} WHERE id IN ({selected})', params).rowcount
     
     def create(self, data: Dict[str, Any]) -> bool:
         """Создание новой записи"""
@@ -38,17 +117,113 @@ class Model:
         placeholders = ', '.join(['?' for _ in data])
         values = list(data.values())
         
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute(
-                    f'INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders})',
-                    values
+        try:
+            cursor = self._execute(
+                f'INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders})',
+                values
+            )
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            return False
+    
+    def create_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Создание пачки записей одним executemany в одной транзакции.
+        
+        Все строки должны иметь одинаковый набор колонок. Возвращает id новых
+        записей по порядку; при нарушении ограничения откатывает всю пачку и
+        возвращает пустой список.
+        """
+        if not self.table_name:
+            raise ValueError("Table name not specified")
+        if not rows:
+            return []
+        
+        columns = list(rows[0].keys())
+        placeholders = ', '.join(['?' for _ in columns])
+        
+        try:
+            with self.transaction():
+                self._execute_many(
+                    f'INSERT INTO {self.table_name} ({", ".join(columns)}) VALUES ({placeholders})',
+                    [[row[column] for column in columns] for row in rows]
                 )
-                conn.commit()
-                return cursor.lastrowid
-            except sqlite3.IntegrityError:
-                return False
+                # Пока транзакция держит блокировку записи, AUTOINCREMENT выдаёт id подряд
+                last_id = self._execute('SELECT last_insert_rowid()').fetchone()[0]
+        except sqlite3.IntegrityError:
+            return []
+        
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+    
+    def update_many(self, rows: List[Dict[str, Any]], key: List[str] = None) -> List[int]:
+        """Обновление пачки записей одним executemany в одной транзакции.
+        
+        Каждая строка содержит ключевые колонки (по умолчанию id) и новые значения.
+        Возвращает id записей с этими ключами (для ключа id - переданные id).
+        """
+        if not self.table_name:
+            raise ValueError("Table name not specified")
+        if not rows:
+            return []
+        
+        key = key or ['id']
+        columns = [column for column in rows[0].keys() if column not in key]
+        set_clause = ', '.join([f'{column} = ?' for column in columns])
+        where_clause = ' AND '.join([f'{column} = ?' for column in key])
+        
+        with self.transaction():
+            self._execute_many(
+                f'UPDATE {self.table_name} SET {set_clause} WHERE {where_clause}',
+                [[row[column] for column in columns + key] for row in rows]
+            )
+            return self._ids_by_key(rows, key)
+    
+    def upsert(self, rows: List[Dict[str, Any]], conflict: List[str], update: List[str] = None) -> List[int]:
+        """INSERT ... ON CONFLICT DO UPDATE для пачки записей.
+        
+        conflict - колонки уникального индекса, update - колонки, которые
+        перезаписываются при конфликте (по умолчанию все остальные).
+        Возвращает id записей в порядке rows.
+        """
+        if not self.table_name:
+            raise ValueError("Table name not specified")
+        if not rows:
+            return []
+        
+        columns = list(rows[0].keys())
+        update = update or [column for column in columns if column not in conflict]
+        placeholders = ', '.join(['?' for _ in columns])
+        on_conflict = ', '.join([f'{column} = excluded.{column}' for column in update]) if update else None
+        
+        query = (
+            f'INSERT INTO {self.table_name} ({", ".join(columns)}) VALUES ({placeholders}) '
+            f'ON CONFLICT ({", ".join(conflict)}) '
+            + (f'DO UPDATE SET {on_conflict}' if on_conflict else 'DO NOTHING')
+        )
+        
+        with self.transaction():
+            self._execute_many(query, [[row[column] for column in columns] for row in rows])
+            return self._ids_by_key(rows, conflict)
+    
+    def _execute_many(self, query: str, params: List[List[Any]]) -> sqlite3.Cursor:
+        conn = self._connect()
+        started = time.perf_counter()
+        cursor = conn.executemany(query, params)
+        self._record(conn, query, None, started, cursor.rowcount)
+        return cursor
+    
+    def _ids_by_key(self, rows: List[Dict[str, Any]], key: List[str]) -> List[int]:
+        """id записей по значениям ключевых колонок (executemany не возвращает строки)"""
+        if key == ['id']:
+            return [row['id'] for row in rows]
+        # Один запрос на всю пачку: ключи строк - таблица VALUES, порядок - как в rows
+        values = ', '.join(['(?' + ', ?' * len(key) + ')' for _ in rows])
+        on_clause = ' AND '.join([f't.{column} = k.{column}' for column in key])
+        query = (
+            f'WITH k (position, {", ".join(key)}) AS (VALUES {values}) '
+            f'SELECT t.id FROM {self.table_name} AS t JOIN k ON {on_clause} ORDER BY k.position'
+        )
+        params = [value for position, row in enumerate(rows) for value in [position] + [row[column] for column in key]]
+        return [found['id'] for found in self._fetch_all(query, params)]
     
     def read(self, conditions: Dict[str, Any] = None, limit: int = None) -> List[Dict[str, Any]]:
         """Чтение записей с условиями"""
@@ -73,12 +248,33 @@ class Model:
         if limit:
             query += f' LIMIT {limit}'
         
-        with self._connect() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+        rows = self._fetch_all(query, params)
+        return [dict(row) for row in rows]
+    
+    def iterate(self, query: str, params: List[Any] = None, batch_size: int = 500):
+        """Построчное чтение большого результата: строки приходят пачками fetchmany.
+        
+        Генератор держит курсор соединения текущего потока - читать его нужно
+        до конца в том же потоке (например, целиком внутри db_executor.run).
+        """
+        conn = self._connect()
+        started = time.perf_counter()
+        cursor = conn.execute(query, params or [])
+        elapsed = time.perf_counter() - started
+        rows = 0
+        try:
+            while True:
+                fetch_started = time.perf_counter()
+                batch = cursor.fetchmany(batch_size)
+                elapsed += time.perf_counter() - fetch_started
+                if not batch:
+                    break
+                rows += len(batch)
+                yield from batch
+        finally:
+            cursor.close()
+            # В учёт идёт только время SQLite, без обработки строк вызывающим
+            self._record(conn, query, params, time.perf_counter() - elapsed, rows)
     
     def read_one(self, conditions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Чтение одной записи"""
@@ -95,14 +291,11 @@ class Model:
         
         params = list(updates.values()) + list(conditions.values())
         
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                f'UPDATE {self.table_name} SET {set_clause} WHERE {where_clause}',
-                params
-            )
-            conn.commit()
-            return cursor.rowcount > 0
+        cursor = self._execute(
+            f'UPDATE {self.table_name} SET {set_clause} WHERE {where_clause}',
+            params
+        )
+        return cursor.rowcount > 0
     
     def delete(self, conditions: Dict[str, Any]) -> bool:
         """Удаление записей"""
@@ -112,25 +305,41 @@ class Model:
         where_clause = ' AND '.join([f'{key} = ?' for key in conditions.keys()])
         params = list(conditions.values())
         
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                f'DELETE FROM {self.table_name} WHERE {where_clause}',
-                params
-            )
-            conn.commit()
-            return cursor.rowcount > 0
+        cursor = self._execute(
+            f'DELETE FROM {self.table_name} WHERE {where_clause}',
+            params
+        )
+        return cursor.rowcount > 0
     
     def execute_custom_query(self, query: str, params: List[Any] = None) -> List[Dict[str, Any]]:
         """Выполнение кастомного SQL запроса"""
-        with self._connect() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(query, params or [])
-            
-            if query.strip().upper().startswith('SELECT'):
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
-            else:
-                conn.commit()
-                return []
\ No newline at end of file
+        rows = self._fetch_all(query, params)
+        return [dict(row) for row in rows]
+    
+    # Асинхронный слой доступа к данным: те же операции, но в пуле потоков БД
+    async def acreate(self, data: Dict[str, Any]) -> bool:
+        return await db_executor.run(self.create, data)
+    
+    async def acreate_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        return await db_executor.run(self.create_many, rows)
+    
+    async def aupdate_many(self, rows: List[Dict[str, Any]], key: List[str] = None) -> List[int]:
+        return await db_executor.run(self.update_many, rows, key)
+    
+    async def aupsert(self, rows: List[Dict[str, Any]], conflict: List[str], update: List[str] = None) -> List[int]:
+        return await db_executor.run(self.upsert, rows, conflict, update)
+    
+    async def aread(self, conditions: Dict[str, Any] = None, limit: int = None) -> List[Dict[str, Any]]:
+        return await db_executor.run(self.read, conditions, limit)
+    
+    async def aread_one(self, conditions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await db_executor.run(self.read_one, conditions)
+    
+    async def aupdate(self, updates: Dict[str, Any], conditions: Dict[str, Any]) -> bool:
+        return await db_executor.run(self.update, updates, conditions)
+    
+    async def adelete(self, conditions: Dict[str, Any]) -> bool:
+        return await db_executor.run(self.delete, conditions)
+    
+    async def aexecute_custom_query(self, query: str, params: List[Any] = None) -> List[Dict[str, Any]]:
+        return await db_executor.run(self.execute_custom_query, query, params)
\ No newline at end of file
@@ -0,0 +1,183 @@
+import contextvars
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from Class.Metrics import metrics
+
+HANDLER_SECONDS = metrics.histogram('tasktreker_handler_seconds', 'Время обработчиков контроллеров', ('handler',))
+HANDLER_ERRORS = metrics.counter('tasktreker_handler_errors_total', 'Исключения в обработчиках контроллеров', ('handler',))
+HANDLER_QUERIES = metrics.counter('tasktreker_handler_queries_total', 'Запросы к БД из обработчиков контроллеров', ('handler',))
+
+class ActionStats:
+    """Запросы к БД одного действия пользователя (обработчика контроллера)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.queries = 0
+        self.seconds = 0.0
+        self.fingerprints = {}  # отпечаток -> сколько раз выполнен
+
+class QueryLog:
+    """Учёт запросов моделей: отпечаток, строки, время, вызывающий метод.
+
+    Медленные запросы (дольше SLOW_QUERY_MS) печатаются в лог. При QUERY_EXPLAIN=1
+    для каждого нового отпечатка снимается EXPLAIN QUERY PLAN, полные просмотры
+    таблиц отмечаются. Повтор одного запроса в действии больше QUERY_REPEAT_WARN
+    раз помечается как N+1.
+    """
+    SKIP_DIRS = ('Class', 'Model')  # вызывающий - первый кадр стека вне этих каталогов
+
+    _action = contextvars.ContextVar('query_action', default=None)
+
+    def __init__(self):
+        self.slow_ms = float(os.getenv('SLOW_QUERY_MS', 100))
+        self.explain = os.getenv('QUERY_EXPLAIN', '0') == '1'
+        self.log_actions = os.getenv('QUERY_LOG_ACTIONS', '0') == '1'
+        self.repeat_warn = int(os.getenv('QUERY_REPEAT_WARN', 5))
+        self._root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._skip = tuple(os.path.join(self._root, name) + os.sep for name in self.SKIP_DIRS)
+        self._model_dir = os.path.join(self._root, 'Model') + os.sep
+        self._lock = threading.Lock()
+        self.queries = {}  # отпечаток -> {calls, rows, total_ms, max_ms, callers, full_scan}
+        self.actions = {}  # имя действия -> {calls, queries, total_ms, max_queries}
+        self.slow = 0
+        self._explained = set()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def fingerprint(query: str) -> str:
+        """Текст запроса без литералов и лишних пробелов"""
+        query = re.sub(r"'(?:[^']|'')*'", '?', query)
+        query = re.sub(r'\b\d+(?:\.\d+)?\b', '?', query)
+        query = re.sub(r'\s+', ' ', query).strip()
+        return re.sub(r'IN \(\?(?:, \?)*\)', 'IN (...)', query)
+
+    def _caller(self):
+        """Первый метод проекта вне Class/Model, иначе самый внешний метод модели"""
+        frame = sys._getframe(2)
+        model_frame = None
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(self._root):
+                if not filename.startswith(self._skip):
+                    return self._frame_name(frame)
+                if filename.startswith(self._model_dir):
+                    model_frame = frame
+            frame = frame.f_back
+        return self._frame_name(model_frame) if model_frame else 'unknown'
+
+    def _frame_name(self, frame):
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+    def record(self, conn, query: str, params, elapsed: float, rows: int):
+        """Учёт выполненного запроса (elapsed - время выполнения в секундах)"""
+        elapsed_ms = elapsed * 1000
+        fingerprint = self.fingerprint(query)
+        caller = self._caller()
+        action = self._action.get()
+
+        with self._lock:
+            stat = self.queries.get(fingerprint)
+            if stat is None:
+                stat = self.queries[fingerprint] = {
+                    'calls': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'callers': {}, 'full_scan': None
+                }
+            stat['calls'] += 1
+            stat['rows'] += max(rows, 0)
+            stat['total_ms'] += elapsed_ms
+            stat['max_ms'] = max(stat['max_ms'], elapsed_ms)
+            stat['callers'][caller] = stat['callers'].get(caller, 0) + 1
+
+            repeated = 0
+            if action is not None:
+                action.queries += 1
+                action.seconds += elapsed_ms / 1000
+                repeated = action.fingerprints[fingerprint] = action.fingerprints.get(fingerprint, 0) + 1
+
+            explain = self.explain and fingerprint not in self._explained
+            if explain:
+                self._explained.add(fingerprint)
+
+        if elapsed_ms >= self.slow_ms:
+            self.slow += 1
+            print(f"🐢 Медленный запрос {elapsed_ms:.1f} мс, строк {rows} [{caller}]: {fingerprint}")
+        if repeated == self.repeat_warn + 1:
+            print(f"🔁 Запрос выполнен больше {self.repeat_warn} раз за действие {action.name} [{caller}]: {fingerprint}")
+        if explain:
+            self._explain(conn, query, params, fingerprint, caller)
+
+    def _explain(self, conn, query, params, fingerprint, caller):
+        """EXPLAIN QUERY PLAN для нового отпечатка: ищем полный просмотр таблицы"""
+        if not fingerprint.upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')):
+            return
+        try:
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params or [])]
+        except Exception:
+            return
+        scans = [
+            detail for detail in plan
+            if detail.startswith('SCAN ') and ' USING ' not in detail and detail != 'SCAN CONSTANT ROW'
+        ]
+        with self._lock:
+            self.queries[fingerprint]['full_scan'] = bool(scans)
+        if scans:
+            print(f"⚠️ Полный просмотр таблицы ({'; '.join(scans)}) [{caller}]: {fingerprint}")
+
+    @contextmanager
+    def action(self, name: str, detached: bool = False):
+        """Границы действия пользователя. Вложенное действие учитывается во внешнем.
+
+        detached - фоновая работа, запущенная из обработчика (например, отправка
+        очереди Битрикса): учитывается отдельно, а не в действии пользователя.
+        """
+        current = self._action.get()
+        if current is not None and not detached:
+            yield current
+            return
+
+        stats = ActionStats(name)
+        token = self._action.set(stats)
+        try:
+            yield stats
+        finally:
+            self._action.reset(token)
+            with self._lock:
+                summary = self.actions.setdefault(name, {'calls': 0, 'queries': 0, 'total_ms': 0.0, 'max_queries': 0})
+                summary['calls'] += 1
+                summary['queries'] += stats.queries
+                summary['total_ms'] += stats.seconds * 1000
+                summary['max_queries'] = max(summary['max_queries'], stats.queries)
+            if self.log_actions:
+                print(f"🧮 {name}: {stats.queries} запросов к БД, {stats.seconds * 1000:.1f} мс")
+
+    def top(self, limit: int = 10, key: str = 'total_ms'):
+        """Самые тяжёлые запросы по суммарному времени (или другому полю)"""
+        with self._lock:
+            items = [(fingerprint, dict(stat, callers=dict(stat['callers']))) for fingerprint, stat in self.queries.items()]
+        return sorted(items, key=lambda item: item[1][key], reverse=True)[:limit]
+
+query_log = QueryLog()
+
+def tracked_action(handler):
+    """Декоратор обработчика: одно действие для учёта запросов и метрики обработчика"""
+    name = handler.__qualname__
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        with query_log.action(name) as stats:
+            try:
+                return await handler(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+                HANDLER_QUERIES.inc(stats.queries, handler=name)
+    return wrapper
\ No newline at end of file
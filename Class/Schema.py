@@ -0,0 +1,56 @@
+import threading
+from Class.Database import Database
+
+class Schema:
+    """Реестр версионированных миграций схемы БД.
+
+    Версия схемы хранится в PRAGMA user_version. Миграции применяются по
+    порядку один раз на процесс для каждого файла БД, каждая в своей транзакции.
+    """
+
+    _migrations = {}
+    _bootstrapped = set()
+    _in_progress = set()
+    _lock = threading.RLock()
+
+    @classmethod
+    def migration(cls, version: int):
+        """Декоратор регистрации миграции: функция получает путь к БД"""
+        def register(func):
+            if version in cls._migrations:
+                raise ValueError(f"Migration {version} already registered")
+            cls._migrations[version] = func
+            return func
+        return register
+
+    @classmethod
+    def version(cls, db_path: str) -> int:
+        return Database.get(db_path).connection().execute('PRAGMA user_version').fetchone()[0]
+
+    @classmethod
+    def bootstrap(cls, db_path: str = "timers.db"):
+        """Приводит БД к актуальной версии схемы (повторные вызовы ничего не делают)"""
+        if db_path in cls._bootstrapped:
+            return
+
+        with cls._lock:
+            # Миграции сами создают модели, а те вызывают bootstrap - не заходим повторно
+            if db_path in cls._bootstrapped or db_path in cls._in_progress:
+                return
+            cls._in_progress.add(db_path)
+            try:
+                # Миграции объявлены рядом с моделями; импорт здесь, чтобы избежать циклического импорта
+                import Model.Migrations  # noqa: F401
+
+                database = Database.get(db_path)
+                current = cls.version(db_path)
+                for version in sorted(cls._migrations):
+                    if version <= current:
+                        continue
+                    with database.transaction() as transaction:
+                        cls._migrations[version](db_path)
+                        transaction.conn.execute(f'PRAGMA user_version = {version}')
+                    print(f"🗄 Схема БД обновлена до версии {version}")
+                cls._bootstrapped.add(db_path)
+            finally:
+                cls._in_progress.discard(db_path)
\ No newline at end of file
@@ -0,0 +1,15 @@
+import threading
+
+class Singleton:
+    """Общий на процесс экземпляр класса: Class.instance(*args)"""
+
+    _instances = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def instance(cls, *args):
+        key = (cls, args)
+        with Singleton._lock:
+            if key not in Singleton._instances:
+                Singleton._instances[key] = cls(*args)
+            return Singleton._instances[key]
\ No newline at end of file
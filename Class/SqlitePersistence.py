@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+from telegram.ext import BasePersistence, PersistenceInput
+from Class.Executor import db_executor
+from Model.ConversationState import ConversationState
+
+class SqlitePersistence(BasePersistence):
+    """Хранение context.user_data (состояние диалога отчёта) в таблице conversation_state.
+
+    Состояние пользователя загружается при первом его обновлении после запуска,
+    а не целиком на старте. Записываются только пользователи, чьё состояние
+    изменилось с последней записи, все разом одной транзакцией. Пустое состояние
+    удаляет строку. Остальные виды данных PTB не хранятся.
+    """
+
+    def __init__(self, update_interval: float = None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval or float(os.getenv('PERSISTENCE_INTERVAL', 10)),
+        )
+        self.state_model = ConversationState.instance()
+        self._snapshots = {}  # user_id -> JSON последней записи или загрузки
+        self._dirty = {}  # user_id -> JSON (None - удалить)
+        self._flush_task = None
+
+    def _serialize(self, data):
+        return json.dumps(data, ensure_ascii=False, sort_keys=True, default=str) if data else None
+
+    async def get_user_data(self):
+        # Ленивая загрузка: состояние читается в refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id, user_data):
+        if user_id in self._snapshots:
+            return
+        stored = await db_executor.run(self.state_model.load, user_id)
+        if stored and not user_data:
+            user_data.update(json.loads(stored))
+        self._snapshots[user_id] = stored
+
+    async def update_user_data(self, user_id, data):
+        serialized = self._serialize(data)
+        if self._snapshots.get(user_id) == serialized:
+            self._dirty.pop(user_id, None)
+            return
+        self._dirty[user_id] = serialized
+        # Application вызывает update_user_data для всех пользователей интервала разом -
+        # пишем их одной пачкой
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_soon())
+        await asyncio.shield(self._flush_task)
+
+    async def drop_user_data(self, user_id):
+        self._dirty[user_id] = None
+        await self.flush()
+
+    async def _flush_soon(self):
+        await asyncio.sleep(0)
+        await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await db_executor.run(self.state_model.save_many, dirty)
+        except Exception as e:
+            # Не записанное попробуем ещё раз на следующем интервале, новые изменения важнее
+            for user_id, serialized in dirty.items():
+                self._dirty.setdefault(user_id, serialized)
+            print(f"❌ Не удалось сохранить состояние диалогов: {e}")
+            return
+        self._snapshots.update(dirty)
+
+    # Остальные данные PTB (чаты, bot_data, callback_data, ConversationHandler) не используются
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def update_conversation(self, name, key, new_state):
+        pass
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
\ No newline at end of file
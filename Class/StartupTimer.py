@@ -0,0 +1,22 @@
+import time
+
+class StartupTimer:
+    """Замер этапов запуска бота: от импорта bot.py до готовности принимать обновления"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.stages = []
+
+    def mark(self, stage: str):
+        """Завершение этапа: его длительность - время с предыдущей отметки"""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def report(self):
+        stages = ', '.join(f"{stage} {seconds * 1000:.0f}" for stage, seconds in self.stages)
+        print(f"🚀 Запуск за {(self.last - self.started) * 1000:.0f} мс ({stages})")
+
+# Создаётся при первом импорте - bot.py импортирует модуль раньше остальных
+startup = StartupTimer()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка для каждого пользователя.
+
+    Обновления разных пользователей выполняются одновременно (не больше
+    max_workers), обновления одного пользователя - строго по очереди, поэтому
+    диалог awaiting_task_id/awaiting_comment не ломается.
+
+    Очередь пользователя стоит до слота базового класса (max_pending): слот
+    занимает только его ближайшее обновление, и поток сообщений от одного
+    пользователя не задерживает остальных.
+    """
+    LAG_HISTORY = 1000  # сколько пользователей помнить в статистике задержек
+
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        self.max_workers = max_workers or int(os.getenv('UPDATE_CONCURRENCY', 8))
+        # Лимит базового класса - сколько обновлений может одновременно ждать и выполняться
+        super().__init__(max_pending or int(os.getenv('UPDATE_MAX_PENDING', 256)))
+        self._workers = asyncio.Semaphore(self.max_workers)
+        self._users = {}  # user_id -> [lock, обновлений в очереди пользователя]
+        self.pending = 0  # принятые обновления: ждущие и выполняющиеся
+        self.running = 0
+        self.processed = 0
+        self.lag = OrderedDict()  # user_id -> (последняя задержка, максимальная задержка)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _key(self, update):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    async def process_update(self, update, coroutine):
+        user_id = self._key(update)
+        enqueued = time.monotonic()
+        self.pending += 1
+        entry = None
+        if user_id is not None:
+            entry = self._users.setdefault(user_id, [asyncio.Lock(), 0])
+            entry[1] += 1
+
+        try:
+            if entry is None:
+                # Обновления без пользователя порядка не требуют
+                await super().process_update(update, self._run(None, enqueued, coroutine))
+            else:
+                # asyncio.Lock будит ожидающих по очереди - порядок обновлений пользователя сохраняется
+                async with entry[0]:
+                    await super().process_update(update, self._run(user_id, enqueued, coroutine))
+        finally:
+            self.pending -= 1
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._users.pop(user_id, None)
+
+    async def do_process_update(self, update, coroutine):
+        # Вызывается базовым классом внутри его слота, порядок пользователя уже соблюдён
+        async with self._workers:
+            await coroutine
+
+    async def _run(self, user_id, enqueued, coroutine):
+        lag = time.monotonic() - enqueued
+        if user_id is not None:
+            _, max_lag = self.lag.pop(user_id, (0.0, 0.0))
+            self.lag[user_id] = (lag, max(lag, max_lag))
+            while len(self.lag) > self.LAG_HISTORY:
+                self.lag.popitem(last=False)
+        self.running += 1
+        try:
+            await coroutine
+        finally:
+            self.running -= 1
+            self.processed += 1
+
+    def stats(self, top: int = 10):
+        """Глубина очереди и задержка до начала обработки по пользователям"""
+        slowest = sorted(self.lag.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return {
+            'max_workers': self.max_workers,
+            'running': self.running,
+            'waiting': self.pending - self.running,
+            'processed': self.processed,
+            'users_queued': {user_id: entry[1] for user_id, entry in self._users.items()},
+            'lag_seconds': {
+                user_id: {'last': round(last, 3), 'max': round(max_lag, 3)}
+                for user_id, (last, max_lag) in slowest
+            },
+        }
\ No newline at end of file
@@ -1,4 +1,5 @@
 from Class.Controller import Controller
+from Class.QueryLog import tracked_action
 from Services.ReportService import ReportService
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -6,8 +7,9 @@ from telegram.ext import ContextTypes
 class ReportController(Controller):
     def __init__(self):
         super().__init__()
-        self.report_service = ReportService()
+        self.report_service = ReportService.instance()
     
+    @tracked_action
     async def generate_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик кнопки отчёта"""
         user_id = self.get_user_id(update)
@@ -16,10 +18,12 @@ class ReportController(Controller):
         if result != "DIALOG_STARTED":
             await self.send_response(update, result)
     
+    @tracked_action
     async def handle_task_id_response(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка ответа с ID задачи"""
         await self.report_service.handle_task_id_response(update, context)
     
+    @tracked_action
     async def handle_comment_response(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка ответа с комментарием"""
         await self.report_service.handle_comment_response(update, context)
\ No newline at end of file
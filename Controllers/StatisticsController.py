@@ -0,0 +1,85 @@
+from Class.Controller import Controller
+from Class.QueryLog import tracked_action
+from Services.ExportService import ExportService
+from Services.StatisticsService import StatisticsService
+from telegram import Update
+from telegram.ext import ContextTypes
+
+class StatisticsController(Controller):
+    def __init__(self):
+        super().__init__()
+        self.statistics_service = StatisticsService.instance()
+        self.export_service = ExportService.instance()
+
+    @tracked_action
+    async def week(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /week"""
+        user_id = self.get_user_id(update)
+        result = await self.statistics_service.get_week(user_id)
+        await self.send_response(update, result)
+
+    @tracked_action
+    async def month(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /month"""
+        user_id = self.get_user_id(update)
+        result = await self.statistics_service.get_month(user_id)
+        await self.send_response(update, result)
+
+    @tracked_action
+    async def range(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /stats"""
+        user_id = self.get_user_id(update)
+
+        # Валидация
+        if not context.args or len(context.args) > 2:
+            await self.send_response(update, "Используйте: /stats <с> [по], например /stats 01.09 30.09")
+            return
+
+        try:
+            date_from = self.statistics_service.parse_date(context.args[0])
+            date_to = self.statistics_service.parse_date(context.args[1]) if len(context.args) > 1 else date_from
+        except ValueError:
+            await self.send_response(update, "Дата должна быть в формате ДД.ММ.ГГГГ, ДД.ММ или ГГГГ-ММ-ДД")
+            return
+
+        # Вызов сервиса
+        result = await self.statistics_service.get_range(user_id, date_from, date_to)
+        await self.send_response(update, result)
+
+    @tracked_action
+    async def export(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /export"""
+        user_id = self.get_user_id(update)
+        args = list(context.args or [])
+        fmt = args.pop().lower() if args and args[-1].lower() in ('csv', 'xlsx') else 'csv'
+
+        # Валидация
+        if len(args) != 2:
+            await self.send_response(update, "Используйте: /export <с> <по> [csv|xlsx], например /export 01.09 30.09")
+            return
+
+        try:
+            date_from = self.statistics_service.parse_date(args[0])
+            date_to = self.statistics_service.parse_date(args[1])
+        except ValueError:
+            await self.send_response(update, "Дата должна быть в формате ДД.ММ.ГГГГ, ДД.ММ или ГГГГ-ММ-ДД")
+            return
+
+        note = ""
+        if fmt == 'xlsx' and not self.export_service.xlsx_available:
+            fmt = 'csv'
+            note = " (XLSX недоступен на сервере, выгружен CSV)"
+
+        # Вызов сервиса
+        file, filename, count = await self.export_service.export(user_id, date_from, date_to, fmt)
+        try:
+            size = file.seek(0, 2)
+            file.seek(0)
+            if not count:
+                await self.send_response(update, "За период нет сессий таймеров")
+            elif size > self.export_service.MAX_FILE_BYTES:
+                await self.send_response(update, "Выгрузка больше 50 МБ, выберите период поменьше")
+            else:
+                await update.message.reply_document(document=file, filename=filename, caption=f"Сессий: {count}{note}")
+        finally:
+            file.close()
\ No newline at end of file
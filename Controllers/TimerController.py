@@ -1,12 +1,14 @@
 from Class.Controller import Controller
+from Class.QueryLog import tracked_action
 from telegram import Update
 from telegram.ext import ContextTypes
 
 class TimerController(Controller):
+    @tracked_action
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         user_id = self.get_user_id(update)
-        clear_result = self.timer_service.clear_all_timers(user_id)
+        clear_result = await self.timer_service.clear_all_timers(user_id)
         
         message = (
             f"{clear_result}\n\n"
@@ -15,9 +17,13 @@ class TimerController(Controller):
             "/plus название минуты - добавить время\n" 
             "/diff название минуты - убавить время\n" 
             "/delete название - удалить таймер\n"
+            "/week, /month - статистика за неделю и месяц\n"
+            "/stats с [по] - статистика за период\n"
+            "/export с по [csv|xlsx] - выгрузка сессий за период файлом\n"
         )
-        await self.send_response(update, message)
+        await self.send_response(update, message, force_keyboard=True)
     
+    @tracked_action
     async def create_timer(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /new"""
         user_id = self.get_user_id(update)
@@ -46,9 +52,10 @@ class TimerController(Controller):
             return
         
         # Вызов сервиса
-        result = self.timer_service.create_timer(user_id, key, task_id, task_type)
+        result = await self.timer_service.create_timer(user_id, key, task_id, task_type)
         await self.send_response(update, result)
     
+    @tracked_action
     async def add_minutes(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /plus"""
         user_id = self.get_user_id(update)
@@ -72,9 +79,10 @@ class TimerController(Controller):
             return
         
         # Вызов сервиса
-        result = self.timer_service.add_minutes(user_id, timer_name, minutes)
+        result = await self.timer_service.add_minutes(user_id, timer_name, minutes)
         await self.send_response(update, result)
 
+    @tracked_action
     async def diff_minutes(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /diff"""
         user_id = self.get_user_id(update)
@@ -98,9 +106,10 @@ class TimerController(Controller):
             return
         
         # Вызов сервиса
-        result = self.timer_service.add_minutes(user_id, timer_name, -1 * minutes)
+        result = await self.timer_service.add_minutes(user_id, timer_name, -1 * minutes)
         await self.send_response(update, result)
     
+    @tracked_action
     async def delete_timer(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /delete"""
         user_id = self.get_user_id(update)
@@ -113,15 +122,17 @@ class TimerController(Controller):
         timer_name = ' '.join(context.args)
         
         # Вызов сервиса
-        result = self.timer_service.delete_timer(user_id, timer_name)
+        result = await self.timer_service.delete_timer(user_id, timer_name)
         await self.send_response(update, result)
     
+    @tracked_action
     async def show_statistics(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик кнопки статистики"""
         user_id = self.get_user_id(update)
-        stats = self.timer_service.get_statistics(user_id)
+        stats = await self.timer_service.get_statistics(user_id)
         await self.send_response(update, stats)
     
+    @tracked_action
     async def start_timer(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик кнопки старта таймера"""
         user_id = self.get_user_id(update)
@@ -133,9 +144,10 @@ class TimerController(Controller):
             return
         
         # Вызов сервиса
-        result = self.timer_service.start_timer(user_id, timer_name)
+        result = await self.timer_service.start_timer(user_id, timer_name)
         await self.send_response(update, result)
     
+    @tracked_action
     async def stop_timer(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик кнопки остановки таймера"""
         user_id = self.get_user_id(update)
@@ -147,5 +159,5 @@ class TimerController(Controller):
             return
         
         # Вызов сервиса
-        result = self.timer_service.stop_timer(user_id, timer_name)
+        result = await self.timer_service.stop_timer(user_id, timer_name)
         await self.send_response(update, result)
\ No newline at end of file
@@ -0,0 +1,34 @@
+from Class.Model import Model
+
+class ConversationState(Model):
+    """Состояние диалогов пользователя (context.user_data) в виде JSON"""
+
+    def __init__(self, db_path: str = "timers.db"):
+        super().__init__(db_path, "conversation_state")
+
+    def tableSchema(self):
+        return [
+            'user_id INTEGER NOT NULL',
+            'data TEXT NOT NULL',
+            'updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+            'UNIQUE(user_id)',
+        ]
+
+    def load(self, user_id: int):
+        """JSON состояния пользователя или None"""
+        row = self.read_one({"user_id": user_id})
+        return row['data'] if row else None
+
+    def save_many(self, states):
+        """Запись изменившихся состояний одной транзакцией: {user_id: JSON или None для удаления}"""
+        changed = [{"user_id": user_id, "data": data} for user_id, data in states.items() if data is not None]
+        dropped = [user_id for user_id, data in states.items() if data is None]
+        with self.transaction():
+            if changed:
+                self._execute_many('''
+                    INSERT INTO conversation_state (user_id, data) VALUES (?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated_at = CURRENT_TIMESTAMP
+                ''', [[row['user_id'], row['data']] for row in changed])
+            if dropped:
+                placeholders = ', '.join(['?' for _ in dropped])
+                self.execute_custom_query(f'DELETE FROM conversation_state WHERE user_id IN ({placeholders})', dropped)
\ No newline at end of file
@@ -0,0 +1,70 @@
+from Class.Model import Model
+from datetime import date
+
+class DailyTotal(Model):
+    """Дневные итоги по таймерам для статистики за неделю, месяц и период.
+
+    Строка на (пользователь, день, таймер) с задачей и категорией таймера.
+    Обновляется точечно при остановке таймера и добавлении минут.
+    """
+    CATEGORIES = ('кч', 'нкч', 'баги')
+
+    def __init__(self, db_path: str = "timers.db"):
+        super().__init__(db_path, "daily_totals")
+
+    def tableSchema(self):
+        return [
+            'user_id INTEGER NOT NULL',
+            'work_date DATE NOT NULL',
+            'timer_name TEXT NOT NULL',
+            'task_id INTEGER',
+            'category TEXT NOT NULL DEFAULT \'\'',  # кч | нкч | баги | '' (свой комментарий)
+            'seconds REAL NOT NULL DEFAULT 0',
+            'sessions INTEGER NOT NULL DEFAULT 0',
+            'updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+            'UNIQUE (user_id, work_date, timer_name)',
+        ]
+
+    def _category_sql(self, column: str) -> str:
+        categories = ', '.join(f"'{category}'" for category in self.CATEGORIES)
+        return f"CASE WHEN {column} IN ({categories}) THEN {column} ELSE '' END"
+
+    def refresh(self, user_id: int, timer_name: str, sessions: int = 0, work_date: str = None):
+        """Пересчёт строки итогов по таймеру дня (вызывается в транзакции изменения таймера)"""
+        self.execute_custom_query(f'''
+            INSERT INTO daily_totals (user_id, work_date, timer_name, task_id, category, seconds, sessions)
+            SELECT user_id, work_date, name, task_id, {self._category_sql('comment')}, total_seconds, ?
+            FROM timers
+            WHERE user_id = ? AND work_date = ? AND name = ?
+            ON CONFLICT (user_id, work_date, timer_name) DO UPDATE SET
+                task_id = excluded.task_id,
+                category = excluded.category,
+                seconds = excluded.seconds,
+                sessions = daily_totals.sessions + excluded.sessions,
+                updated_at = CURRENT_TIMESTAMP
+        ''', [sessions, user_id, work_date or date.today().isoformat(), timer_name])
+
+    def backfill(self, before: str = None):
+        """Заполнение итогов по уже накопленным таймерам (для миграции и перед архивированием)"""
+        self.execute_custom_query(f'''
+            INSERT OR IGNORE INTO daily_totals (user_id, work_date, timer_name, task_id, category, seconds, sessions)
+            SELECT t.user_id, t.work_date, t.name, t.task_id, {self._category_sql('t.comment')}, t.total_seconds,
+                   (SELECT COUNT(*) FROM timer_sessions s
+                    WHERE s.user_id = t.user_id AND s.timer_name = t.name
+                      AND s.end_time IS NOT NULL AND DATE(s.end_time) = t.work_date)
+            FROM timers t
+            WHERE t.work_date IS NOT NULL AND t.total_seconds > 0 AND t.work_date < ?
+              -- Сессии считаем только для недостающих строк итогов
+              AND NOT EXISTS (SELECT 1 FROM daily_totals d
+                              WHERE d.user_id = t.user_id AND d.work_date = t.work_date AND d.timer_name = t.name)
+        ''', [before or '9999-12-31'])
+
+    def get_range(self, user_id: int, date_from: str, date_to: str):
+        """Дневные итоги пользователя за период (границы включительно)"""
+        query = '''
+            SELECT work_date, timer_name, task_id, category, seconds, sessions
+            FROM daily_totals
+            WHERE user_id = ? AND work_date BETWEEN ? AND ?
+            ORDER BY work_date
+        '''
+        return self.execute_custom_query(query, [user_id, date_from, date_to])
\ No newline at end of file
@@ -0,0 +1,65 @@
+from Class.Schema import Schema
+from Model.User import User
+from Model.Timer import Timer
+from Model.Session import Session
+from Model.Outbox import Outbox
+from Model.DailyTotal import DailyTotal
+from Model.ConversationState import ConversationState
+
+# Миграции должны быть идемпотентными: базы, созданные до появления
+# user_version, проходят их все заново с версии 0
+
+@Schema.migration(1)
+def create_tables(db_path):
+    for model in (User, Timer, Session):
+        model(db_path).createTable()
+
+@Schema.migration(2)
+def add_timers_work_date(db_path):
+    timer = Timer(db_path)
+    if timer.addColumn('work_date DATE'):
+        timer.execute_custom_query(
+            "UPDATE timers SET work_date = DATE(created_at, 'localtime') WHERE work_date IS NULL"
+        )
+
+@Schema.migration(3)
+def create_indexes(db_path):
+    for model in (User, Timer, Session):
+        model(db_path).createIndexes()
+
+@Schema.migration(4)
+def create_outbox(db_path):
+    outbox = Outbox(db_path)
+    outbox.createTable()
+    outbox.createIndexes()
+
+@Schema.migration(5)
+def create_daily_totals(db_path):
+    daily_total = DailyTotal(db_path)
+    daily_total.createTable()
+    daily_total.backfill()
+
+@Schema.migration(6)
+def create_conversation_state(db_path):
+    ConversationState(db_path).createTable()
+
+@Schema.migration(7)
+def create_archive_tables(db_path):
+    # Архивная база подключена к каждому соединению как archive (см. Database._open)
+    for model in (Timer, Session):
+        model(db_path).createTable('archive')
+        model(db_path).createIndexes('archive')
+
+@Schema.migration(8)
+def add_timers_synced(db_path):
+    # Архивная таблица должна повторять колонки рабочей (см. Model.archive)
+    timer = Timer(db_path)
+    for database in ('main', 'archive'):
+        for definition in ('synced_seconds REAL', 'synced_comment TEXT', 'synced_at TIMESTAMP'):
+            timer.addColumn(definition, database)
+
+@Schema.migration(9)
+def add_outbox_unconfirmed(db_path):
+    outbox = Outbox(db_path)
+    for definition in ('unconfirmed_seconds REAL', 'unconfirmed_comment TEXT'):
+        outbox.addColumn(definition)
\ No newline at end of file
@@ -0,0 +1,203 @@
+from Class.Model import Model
+from datetime import datetime
+
+class Outbox(Model):
+    """Очередь отправки затраченного времени в Битрикс"""
+
+    def __init__(self, db_path: str = "timers.db"):
+        super().__init__(db_path, "b24_outbox")
+
+    def tableSchema(self):
+        return [
+            'user_id INTEGER NOT NULL',
+            'timer_id INTEGER NOT NULL',
+            'timer_name TEXT NOT NULL',
+            'action TEXT NOT NULL',  # add | update
+            'task_id INTEGER NOT NULL',
+            'b24_user_id INTEGER',
+            'report_id INTEGER',
+            'seconds REAL NOT NULL',
+            'comment TEXT',
+            'status TEXT NOT NULL DEFAULT \'pending\'',  # pending | sending | failed
+            'attempts INTEGER NOT NULL DEFAULT 0',
+            'next_attempt_at TIMESTAMP NOT NULL',
+            'last_error TEXT',
+            # Добавление, результат которого неизвестен (таймаут, 5xx, остановка бота):
+            # отправленные значения. Перед новым добавлением ищем такую запись в Битриксе
+            'unconfirmed_seconds REAL',
+            'unconfirmed_comment TEXT',
+            'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+            'updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+        ]
+
+    def tableIndexes(self):
+        return [
+            ('idx_outbox_due', '(status, next_attempt_at)'),
+        ]
+
+    def createIndexes(self):
+        super().createIndexes()
+        # Не больше одной ожидающей отправки на таймер: повторные отчёты сливаются в неё
+        self._execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_pending_timer "
+            "ON b24_outbox (timer_id) WHERE status = 'pending'"
+        )
+
+    def enqueue(self, user_id: int, b24_user_id: int, timers):
+        """Постановка таймеров в очередь (с объединением с уже ожидающими отправками)"""
+        query = '''
+            INSERT INTO b24_outbox
+                (user_id, timer_id, timer_name, action, task_id, b24_user_id, report_id, seconds, comment, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (timer_id) WHERE status = 'pending' DO UPDATE SET
+                task_id = excluded.task_id,
+                b24_user_id = excluded.b24_user_id,
+                report_id = COALESCE(excluded.report_id, b24_outbox.report_id),
+                action = CASE WHEN COALESCE(excluded.report_id, b24_outbox.report_id) IS NULL
+                              THEN 'add' ELSE 'update' END,
+                seconds = excluded.seconds,
+                comment = excluded.comment,
+                attempts = 0,
+                next_attempt_at = excluded.next_attempt_at,
+                updated_at = CURRENT_TIMESTAMP
+        '''
+        now = datetime.now()
+        with self.transaction():
+            self._execute_many(query, [[
+                user_id, timer['id'], timer['name'], 'update' if timer.get('report_id') else 'add',
+                timer['task_id'], b24_user_id, timer.get('report_id'), timer['total_seconds'],
+                timer.get('comment', ''), now
+            ] for timer in timers])
+
+    def claim(self, limit: int = 200):
+        """Забирает готовые к отправке записи, помечая их как отправляемые"""
+        return self.execute_custom_query('''
+            UPDATE b24_outbox
+            SET status = 'sending', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (
+                SELECT id FROM b24_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY id LIMIT ?
+            )
+            RETURNING *
+        ''', [datetime.now(), limit])
+
+    def complete(self, outbox_ids):
+        """Удаление успешно отправленных записей"""
+        if outbox_ids:
+            placeholders = ', '.join(['?' for _ in outbox_ids])
+            self.execute_custom_query(f'DELETE FROM b24_outbox WHERE id IN ({placeholders})', list(outbox_ids))
+
+    def promote_pending_adds(self, added):
+        """После успешного добавления ожидающие добавления тех же таймеров становятся обновлениями.
+
+        added - пары (timer_id, report_id), одним запросом на всю пачку.
+        """
+        if not added:
+            return
+        values = ', '.join(['(?, ?)' for _ in added])
+        self.execute_custom_query(f'''
+            WITH added (timer_id, report_id) AS (VALUES {values})
+            UPDATE b24_outbox
+            SET action = 'update',
+                report_id = (SELECT added.report_id FROM added WHERE added.timer_id = b24_outbox.timer_id),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'pending' AND report_id IS NULL AND timer_id IN (SELECT timer_id FROM added)
+        ''', [value for pair in added for value in pair])
+
+    def reschedule(self, failures):
+        """Возврат неудачных отправок в очередь (или отказ после исчерпания попыток).
+
+        failures - кортежи (строка очереди, ошибка, время повтора, отказ, добавление
+        могло пройти). Один запрос на каждый вид изменения.
+        """
+        given_up = [(row['id'], error) for row, error, _, give_up, _ in failures if give_up]
+        retried = []
+        for row, error, retry_at, give_up, unconfirmed in failures:
+            if give_up:
+                continue
+            if unconfirmed:
+                row = dict(row, unconfirmed_seconds=row['seconds'], unconfirmed_comment=row['comment'])
+            retried.append(dict(row, last_error=error, next_attempt_at=retry_at))
+
+        with self.transaction():
+            if given_up:
+                values = ', '.join(['(?, ?)' for _ in given_up])
+                self.execute_custom_query(f'''
+                    WITH failed (id, error) AS (VALUES {values})
+                    UPDATE b24_outbox
+                    SET status = 'failed',
+                        last_error = (SELECT failed.error FROM failed WHERE failed.id = b24_outbox.id),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN (SELECT id FROM failed)
+                ''', [value for item in given_up for value in item])
+            self._requeue(retried)
+
+    def _requeue(self, rows):
+        """Возврат отправляемых записей в pending со значениями из rows.
+
+        Если за время отправки для таймера появилась новая запись, она новее -
+        старую удаляем, а неподтверждённое добавление переходит к новой записи.
+        """
+        if not rows:
+            return
+        values = ', '.join(['(?, ?, ?, ?, ?)' for _ in rows])
+        requeued = self.execute_custom_query(f'''
+            WITH retried (id, error, retry_at, unconfirmed_seconds, unconfirmed_comment) AS (VALUES {values})
+            UPDATE b24_outbox
+            SET status = 'pending',
+                last_error = (SELECT retried.error FROM retried WHERE retried.id = b24_outbox.id),
+                next_attempt_at = (SELECT retried.retry_at FROM retried WHERE retried.id = b24_outbox.id),
+                unconfirmed_seconds = (SELECT retried.unconfirmed_seconds FROM retried WHERE retried.id = b24_outbox.id),
+                unconfirmed_comment = (SELECT retried.unconfirmed_comment FROM retried WHERE retried.id = b24_outbox.id),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT id FROM retried) AND NOT EXISTS (
+                SELECT 1 FROM b24_outbox AS newer
+                WHERE newer.timer_id = b24_outbox.timer_id AND newer.status = 'pending'
+            )
+            RETURNING id
+        ''', [
+            value for row in rows
+            for value in (row['id'], row['last_error'], row['next_attempt_at'],
+                          row['unconfirmed_seconds'], row['unconfirmed_comment'])
+        ])
+
+        requeued = {row['id'] for row in requeued}
+        superseded = [row for row in rows if row['id'] not in requeued]
+        unconfirmed = [row for row in superseded if row['unconfirmed_seconds'] is not None]
+        if unconfirmed:
+            values = ', '.join(['(?, ?, ?)' for _ in unconfirmed])
+            self.execute_custom_query(f'''
+                WITH superseded (timer_id, seconds, comment) AS (VALUES {values})
+                UPDATE b24_outbox
+                SET unconfirmed_seconds = (SELECT superseded.seconds FROM superseded WHERE superseded.timer_id = b24_outbox.timer_id),
+                    unconfirmed_comment = (SELECT superseded.comment FROM superseded WHERE superseded.timer_id = b24_outbox.timer_id)
+                WHERE status = 'pending' AND report_id IS NULL AND unconfirmed_seconds IS NULL
+                  AND timer_id IN (SELECT timer_id FROM superseded)
+            ''', [
+                value for row in unconfirmed
+                for value in (row['timer_id'], row['unconfirmed_seconds'], row['unconfirmed_comment'])
+            ])
+        self.complete([row['id'] for row in superseded])
+
+    def recover(self):
+        """Возвращает в очередь записи, отправка которых прервалась остановкой бота.
+
+        Прерванное добавление могло дойти до Битрикса - оно становится неподтверждённым.
+        """
+        with self.transaction():
+            rows = self.execute_custom_query('''
+                UPDATE b24_outbox
+                SET unconfirmed_seconds = CASE WHEN action = 'add' THEN seconds ELSE unconfirmed_seconds END,
+                    unconfirmed_comment = CASE WHEN action = 'add' THEN comment ELSE unconfirmed_comment END
+                WHERE status = 'sending'
+                RETURNING *
+            ''')
+            self._requeue(rows)
+
+    def status_counts(self):
+        """Размер очереди по статусам"""
+        rows = self.execute_custom_query('SELECT status, COUNT(*) AS count FROM b24_outbox GROUP BY status')
+        counts = {'pending': 0, 'sending': 0, 'failed': 0}
+        counts.update({row['status']: row['count'] for row in rows})
+        return counts
\ No newline at end of file
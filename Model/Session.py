@@ -1,10 +1,10 @@
 from Class.Model import Model
-from datetime import datetime
+from datetime import datetime, date
 
 class Session(Model):
     def __init__(self, db_path: str = "timers.db"):
         super().__init__(db_path, "timer_sessions")
-
+    
     def tableSchema(self):
         return [
             'user_id INTEGER NOT NULL',
@@ -17,21 +17,93 @@ class Session(Model):
             'FOREIGN KEY (user_id, timer_name) REFERENCES timers (user_id, name)',
         ]
     
+    def tableIndexes(self):
+        return [
+            ('idx_sessions_user_timer', '(user_id, timer_name)'),
+            ('idx_sessions_open', '(user_id) WHERE end_time IS NULL'),
+        ]
+    
     def get_active_sessions(self, user_id: int):
         return self.read({"user_id": user_id, "end_time": None})
     
-    def start_session(self, user_id: int, timer_name: str, start_time: datetime):
-        result = self.create({
-            "user_id": user_id,
-            "timer_name": timer_name,
-            "start_time": start_time
-        })
-        if result:
-            return result
-        return None
+    def count_active(self) -> int:
+        """Число запущенных таймеров у всех пользователей (по частичному индексу)"""
+        rows = self.execute_custom_query('SELECT COUNT(*) AS count FROM timer_sessions WHERE end_time IS NULL')
+        return rows[0]['count']
+    
+    def iter_with_timers(self, user_id: int, date_from: str, date_to: str, batch_size: int = 500):
+        """Сессии пользователя, начатые в [date_from, date_to), с данными таймера того дня.
+        
+        Читает рабочую и архивную базы, строки отдаются пачками (см. Model.iterate).
+        """
+        sessions = '''
+                SELECT user_id, timer_name, start_time, end_time, duration_seconds
+                FROM {database}.timer_sessions
+                WHERE user_id = ? AND start_time >= ? AND start_time < ?
+        '''
+        query = f'''
+            SELECT DATE(s.start_time) AS work_date, s.timer_name, s.start_time, s.end_time, s.duration_seconds,
+                   COALESCE(tm.task_id, ta.task_id) AS task_id,
+                   COALESCE(tm.comment, ta.comment) AS comment,
+                   COALESCE(tm.total_seconds, ta.total_seconds) AS timer_seconds
+            FROM ({sessions.format(database='main')} UNION ALL {sessions.format(database='archive')}) s
+            LEFT JOIN main.timers tm
+                ON tm.user_id = s.user_id AND tm.work_date = DATE(s.start_time) AND tm.name = s.timer_name
+            LEFT JOIN archive.timers ta
+                ON ta.user_id = s.user_id AND ta.work_date = DATE(s.start_time) AND ta.name = s.timer_name
+            ORDER BY s.start_time
+        '''
+        return self.iterate(query, [user_id, date_from, date_to] * 2, batch_size)
+    
+    def start_session_if_idle(self, user_id: int, timer_name: str, start_time: datetime):
+        """Открывает сессию одним запросом: только если таймер дня есть и ещё не запущен"""
+        query = '''
+            INSERT INTO timer_sessions (user_id, timer_name, start_time)
+            SELECT ?, ?, ?
+            WHERE EXISTS (
+                SELECT 1 FROM timers WHERE user_id = ? AND work_date = ? AND name = ?
+            ) AND NOT EXISTS (
+                SELECT 1 FROM timer_sessions WHERE user_id = ? AND timer_name = ? AND end_time IS NULL
+            )
+            RETURNING id
+        '''
+        rows = self.execute_custom_query(query, [
+            user_id, timer_name, start_time,
+            user_id, date.today().isoformat(), timer_name,
+            user_id, timer_name
+        ])
+        return rows[0]['id'] if rows else None
     
-    def stop_session(self, session_id: int, end_time: datetime, duration_seconds: float):
-        return self.update(
-            {"end_time": end_time, "duration_seconds": duration_seconds},
-            {"id": session_id}
-        )
\ No newline at end of file
+    def stop_active_session(self, user_id: int, timer_name: str, end_time: datetime):
+        """Закрывает активную сессию и добавляет её длительность к таймеру дня.
+        
+        Длительность считается в SQL, всё выполняется в одной транзакции.
+        Возвращает длительность и новый итог таймера или None, если нечего останавливать.
+        """
+        with self.transaction() as transaction:
+            sessions = self.execute_custom_query('''
+                UPDATE timer_sessions
+                SET end_time = ?,
+                    duration_seconds = (julianday(?) - julianday(start_time)) * 86400,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND timer_name = ? AND end_time IS NULL
+                RETURNING id, duration_seconds
+            ''', [end_time, end_time, user_id, timer_name])
+            
+            duration_seconds = sum(session['duration_seconds'] for session in sessions)
+            timers = sessions and self.execute_custom_query('''
+                UPDATE timers
+                SET total_seconds = total_seconds + ?, updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND work_date = ? AND name = ?
+                RETURNING total_seconds
+            ''', [duration_seconds, user_id, date.today().isoformat(), timer_name])
+            
+            if not timers:
+                transaction.rollback()
+                return None
+        
+        return {
+            "session_ids": [session['id'] for session in sessions],
+            "duration_seconds": duration_seconds,
+            "total_seconds": timers[0]['total_seconds'],
+        }
\ No newline at end of file
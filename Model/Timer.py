@@ -1,4 +1,5 @@
 from Class.Model import Model
+from Class.Executor import db_executor
 from datetime import datetime, date
 
 class Timer(Model):
@@ -13,30 +14,57 @@ class Timer(Model):
             'task_id INTEGER',
             'comment TEXT',
             'report_id INTEGER',
+            'work_date DATE',
+            'synced_seconds REAL',  # время и комментарий, последними отправленные в Битрикс
+            'synced_comment TEXT',
+            'synced_at TIMESTAMP',
             'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
             'updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
         ]
     
+    def tableIndexes(self):
+        return [
+            ('idx_timers_user_date_name', '(user_id, work_date, name)'),
+        ]
+    
     def get_timer(self, user_id: int, name: str):
         today = date.today().isoformat()
-        return self.read_one({"user_id": user_id, "name": name, "DATE(created_at)": today})
+        return self.read_one({"user_id": user_id, "work_date": today, "name": name})
+    
+    async def aget_timer(self, user_id: int, name: str):
+        return await db_executor.run(self.get_timer, user_id, name)
     
     def get_today_timers(self, user_id: int):
         query = '''
-            SELECT name, total_seconds, task_id, comment
+            SELECT id, name, total_seconds, task_id, comment, report_id, synced_seconds, synced_comment
             FROM timers 
-            WHERE user_id = ? AND DATE(created_at) = DATE('now')
+            WHERE user_id = ? AND work_date = ?
         '''
-        return self.execute_custom_query(query, [user_id])
+        return self.execute_custom_query(query, [user_id, date.today().isoformat()])
+    
+    async def aget_today_timers(self, user_id: int):
+        return await db_executor.run(self.get_today_timers, user_id)
+    
+    def linked_report_ids(self, report_ids):
+        """Какие из записей Битрикса уже привязаны к таймерам"""
+        if not report_ids:
+            return set()
+        placeholders = ', '.join(['?' for _ in report_ids])
+        rows = self.execute_custom_query(
+            f'SELECT report_id FROM timers WHERE report_id IN ({placeholders})', list(report_ids)
+        )
+        return {row['report_id'] for row in rows}
     
     def add_time_to_timer(self, user_id: int, name: str, seconds_to_add: float):
+        """Добавляет время к таймеру дня и возвращает новый итог (None, если таймера нет)"""
         query = '''
             UPDATE timers 
             SET total_seconds = total_seconds + ?, updated_at = CURRENT_TIMESTAMP 
-            WHERE user_id = ? AND name = ?
+            WHERE user_id = ? AND work_date = ? AND name = ?
+            RETURNING total_seconds
         '''
-        self.execute_custom_query(query, [seconds_to_add, user_id, name])
-        return True
+        rows = self.execute_custom_query(query, [seconds_to_add, user_id, date.today().isoformat(), name])
+        return rows[0]['total_seconds'] if rows else None
     
     def create_timer(self, user_id: int, name: str, task_id: str = '', timer_type: int = 2):
         comment_map = {3: 'кч', 2: 'нкч', 1: 'баги', 0: ''}
@@ -46,5 +74,6 @@ class Timer(Model):
             "user_id": user_id,
             "name": name,
             "task_id": task_id,
-            "comment": comment
+            "comment": comment,
+            "work_date": date.today().isoformat()
         })
\ No newline at end of file
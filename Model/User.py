@@ -1,4 +1,5 @@
 from Class.Model import Model
+from Class.Executor import db_executor
 
 class User(Model):
     def __init__(self, db_path: str = "timers.db"):
@@ -17,6 +18,9 @@ class User(Model):
     def get_user_by_id(self, user_id: int):
         return self.read_one({"user_id": user_id})
     
+    async def aget_user_by_id(self, user_id: int):
+        return await db_executor.run(self.get_user_by_id, user_id)
+    
     def create_user(self, user_id: int, b24_id: int, name: str = None):
         return self.create({
             "user_id": user_id,
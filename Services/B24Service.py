@@ -1,67 +1,209 @@
-import requests
+import asyncio
 import os
-from Services.EnvService import update_env_file
-import threading
+import random
+import time
+from urllib.parse import urlencode
+import httpx
+from Class.Metrics import metrics
+from Class.Singleton import Singleton
+from Services.B24TokenService import B24TokenService
 
-class B24Service:
-    def refreshTokens(self):
-        threading.Timer(3500, self.refreshTokens).start()
-        try:
-            response = requests.get(
-                os.getenv('B24_BASE_URL') + 
-                '/oauth/token/?grant_type=refresh_token'+
-                '&client_id=' + os.getenv('CLIENT_ID') + 
-                '&client_secret=' + os.getenv('B24_CLIENT_SECRET') +
-                '&refresh_token=' + os.getenv('CRM_REFRESH'),
+REQUEST_SECONDS = metrics.histogram('tasktreker_b24_request_seconds', 'Время вызовов REST Битрикса с повторами', ('method',))
+REQUESTS = metrics.counter('tasktreker_b24_requests_total', 'Вызовы REST Битрикса', ('method', 'result'))
+RETRIES = metrics.counter('tasktreker_b24_retries_total', 'Повторы вызовов REST Битрикса', ('method',))
+
+class B24Service(Singleton):
+    BATCH_LIMIT = 50  # максимум команд в одном вызове batch
+    # Общий keep-alive клиент на весь процесс (пересоздаётся, если сменился event loop)
+    _client = None
+    _client_loop = None
+
+    def __init__(self, base_url: str = None):
+        # base_url можно передать явно, например адрес локального stub-сервера
+        self._base_url = base_url
+        self.tokens = B24TokenService.instance()
+        self.retries = int(os.getenv('B24_RETRIES', 3))
+        self.backoff = float(os.getenv('B24_BACKOFF', 0.5))
+        self.timeout = httpx.Timeout(
+            float(os.getenv('B24_READ_TIMEOUT', 15)),
+            connect=float(os.getenv('B24_CONNECT_TIMEOUT', 5)),
+        )
+
+    @property
+    def base_url(self):
+        return self._base_url or os.getenv('B24_BASE_URL')
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if B24Service._client is None or B24Service._client_loop is not loop:
+            B24Service._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
             )
-            response_data = response.json()
-            
-            if response.status_code == 200 and 'access_token' in response_data:
-                
-                # Обновляем .env файл
-                update_env_file(response_data['access_token'], response_data['refresh_token'])
-                
-                print("✅ Токены успешно обновлены!")
-                return 1
-                
-            else:
-                print(f"❌ Ошибка при обновлении токенов: {response_data}")
-                return 0
-                
-        except Exception as e:
-            print(f"❌ Ошибка при запросе: {e}")
-            return 0
-
-    def addTime(self, taskId, userId, time, comment):
-        response = requests.post(
-            os.getenv('B24_BASE_URL') + '/rest/task.elapseditem.add',
-            json={
-                'auth': os.getenv('CRM_TOKEN'),
-                'TASKID': taskId,
-                'ARFIELDS': {
-                    "SECONDS": time, 
-                    "COMMENT_TEXT": comment,
-                    "USER_ID": userId
-                }
+            B24Service._client_loop = loop
+        return B24Service._client
+
+    @classmethod
+    async def close(cls):
+        """Закрытие общего HTTP клиента (при остановке бота)"""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+            cls._client_loop = None
+
+    def _account(self, method, seconds, error=False, retry=False):
+        if retry:
+            RETRIES.inc(method=method)
+            return
+        REQUEST_SECONDS.observe(seconds, method=method)
+        REQUESTS.inc(method=method, result='error' if error else 'ok')
+
+    async def _post(self, method, payload, idempotent=True):
+        """Вызов REST метода с токеном доступа.
+
+        Если Битрикс отверг токен как истёкший, токен обновляется (одно обновление
+        на все одновременные запросы) и вызов повторяется один раз.
+        """
+        token = await self.tokens.get_access_token()
+        response = await self._send(method, {'auth': token, **payload}, idempotent)
+        if self._is_token_expired(response):
+            await self.tokens.refresh(stale_token=token)
+            response = await self._send(method, {'auth': self.tokens.access_token, **payload}, idempotent)
+        return response
+
+    def _is_token_expired(self, response) -> bool:
+        if response.status_code != 401:
+            return False
+        try:
+            return response.json().get('error') in ('expired_token', 'invalid_token')
+        except ValueError:
+            return True
+
+    def _is_retryable(self, status_code, idempotent) -> bool:
+        # 429 и 503 - запрос отклонён до выполнения, повтор безопасен для любого вызова.
+        # Остальные 5xx (500, 502, 504) могли прийти уже после того, как Битрикс применил вызов
+        if status_code in (429, 503):
+            return True
+        return idempotent and status_code >= 500
+
+    async def _send(self, method, payload, idempotent=True):
+        """POST в REST Битрикса с повторами на 5xx, 429 и сетевых ошибках.
+
+        Неидемпотентные вызовы (добавление записи) повторяются только если запрос
+        точно не выполнен: ошибка соединения, 503 или 429. После таймаута чтения или
+        другого 5xx запрос мог дойти до Битрикса, и повтор создал бы дубль.
+        """
+        client = self._get_client()
+        url = self.base_url + '/rest/' + method
+        started = time.perf_counter()
+
+        for attempt in range(self.retries + 1):
+            try:
+                response = await client.post(url, json=payload)
+                if not self._is_retryable(response.status_code, idempotent) or attempt == self.retries:
+                    self._account(method, time.perf_counter() - started, error=response.status_code != 200)
+                    return response
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if attempt == self.retries:
+                    self._account(method, time.perf_counter() - started, error=True)
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt == self.retries:
+                    self._account(method, time.perf_counter() - started, error=True)
+                    raise
+
+            # Экспоненциальная задержка с полным джиттером
+            self._account(method, 0, retry=True)
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def addTimeCommand(self, taskId, userId, time, comment):
+        """Команда добавления затраченного времени: (метод, параметры)"""
+        return 'task.elapseditem.add', {
+            'TASKID': taskId,
+            'ARFIELDS': {
+                "SECONDS": time,
+                "COMMENT_TEXT": comment,
+                "USER_ID": userId
             }
-        )
-        if response.status_code == 200:
-            data = response.json()
-            return data['result']
-        return False
-    
-    def updateTime(self, taskId, reportId, time, comment):
-        response = requests.post(
-            os.getenv('B24_BASE_URL') + '/rest/task.elapseditem.update',
-            json={
-                'auth': os.getenv('CRM_TOKEN'),
-                'TASKID': taskId,
-                'ITEMID': reportId,
-                'ARFIELDS': {
-                    "SECONDS": time, 
-                    "COMMENT_TEXT": comment
-                }
+        }
+
+    def updateTimeCommand(self, taskId, reportId, time, comment):
+        """Команда обновления затраченного времени: (метод, параметры)"""
+        return 'task.elapseditem.update', {
+            'TASKID': taskId,
+            'ITEMID': reportId,
+            'ARFIELDS': {
+                "SECONDS": time,
+                "COMMENT_TEXT": comment
             }
-        )
-        return response.status_code == 200
-        
\ No newline at end of file
+        }
+
+    def findTimeCommand(self, taskId, userId, createdFrom):
+        """Команда поиска записей затраченного времени пользователя в задаче (новые первыми)"""
+        return 'task.elapseditem.getlist', {
+            'TASKID': taskId,
+            'ORDER': {'ID': 'desc'},
+            'FILTER': {'USER_ID': userId, '>=CREATED_DATE': createdFrom}
+        }
+
+    def _query(self, params, prefix=None):
+        """Параметры в query string в формате PHP (ARFIELDS[SECONDS]=...)"""
+        pairs = []
+        for key, value in params.items():
+            name = f'{prefix}[{key}]' if prefix else key
+            if isinstance(value, dict):
+                pairs.extend(self._query(value, name))
+            else:
+                pairs.append((name, '' if value is None else value))
+        return pairs
+
+    async def batch(self, commands):
+        """Выполнение команд через REST метод batch.
+
+        commands: {ключ: (метод, параметры)}. Команды отправляются пачками по
+        BATCH_LIMIT. Возвращает (results, errors, unknown): results и errors -
+        словари по тем же ключам, команды упавших пачек попадают в errors.
+        unknown - ключи из errors, которые Битрикс мог выполнить: ответа на
+        пачку нет (таймаут чтения, обрыв) или пришёл 5xx, кроме 503.
+        """
+        results, errors, unknown = {}, {}, set()
+        items = list(commands.items())
+
+        for start in range(0, len(items), self.BATCH_LIMIT):
+            chunk = items[start:start + self.BATCH_LIMIT]
+            cmd = {
+                key: f'{method}?{urlencode(self._query(params))}'
+                for key, (method, params) in chunk
+            }
+            # В пачке могут быть добавления, поэтому таймаут чтения не повторяем
+            try:
+                response = await self._post('batch', {
+                    'halt': 0,
+                    'cmd': cmd
+                }, idempotent=False)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                errors.update({key: str(e) for key, _ in chunk})
+                continue
+            except httpx.HTTPError as e:
+                errors.update({key: str(e) for key, _ in chunk})
+                unknown.update(key for key, _ in chunk)
+                continue
+
+            if response.status_code != 200:
+                errors.update({key: f'HTTP {response.status_code}' for key, _ in chunk})
+                if response.status_code >= 500 and response.status_code != 503:
+                    unknown.update(key for key, _ in chunk)
+                continue
+
+            data = response.json().get('result', {})
+            chunk_errors = data.get('result_error') or {}
+            chunk_results = data.get('result') or {}
+            for key, _ in chunk:
+                if key in chunk_errors:
+                    errors[key] = chunk_errors[key]
+                elif key in chunk_results:
+                    results[key] = chunk_results[key]
+                else:
+                    errors[key] = 'нет ответа'
+
+        return results, errors, unknown
\ No newline at end of file
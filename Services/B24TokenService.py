@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+import httpx
+from Class.Executor import db_executor
+from Class.Metrics import metrics
+from Class.Singleton import Singleton
+from Services.EnvService import update_env_file
+
+REFRESHES = metrics.counter('tasktreker_b24_token_refresh_total', 'Обновления токена Битрикса', ('result',))
+
+class B24TokenService(Singleton):
+    """Токены Битрикса в памяти процесса.
+
+    Токен обновляется лениво - незадолго до истечения или после ответа
+    expired_token. Одновременные запросы ждут одно общее обновление.
+    """
+
+    def __init__(self):
+        self.access_token = os.getenv('CRM_TOKEN')
+        self.refresh_token = os.getenv('CRM_REFRESH')
+        # Срок неизвестен (старый .env) - считаем токен истёкшим и обновляем при первом вызове
+        self.expires_at = float(os.getenv('CRM_TOKEN_EXPIRES') or 0)
+        self.margin = int(os.getenv('B24_TOKEN_MARGIN', 60))
+        self._lock = asyncio.Lock()
+
+    def is_fresh(self, margin: int = None) -> bool:
+        margin = self.margin if margin is None else margin
+        return bool(self.access_token) and time.time() < self.expires_at - margin
+
+    async def get_access_token(self, margin: int = None) -> str:
+        """Действующий токен доступа (обновляется, если скоро истекает)"""
+        if not self.is_fresh(margin):
+            await self.refresh(margin=margin)
+        return self.access_token
+
+    async def refresh(self, stale_token: str = None, margin: int = None) -> bool:
+        """Обновление токенов (single-flight).
+
+        stale_token - токен, который Битрикс отверг: если его уже заменили,
+        пока мы ждали блокировку, повторно не обновляем.
+        """
+        async with self._lock:
+            # Пока ждали блокировку, токен уже обновил другой запрос
+            if stale_token is not None:
+                if self.access_token != stale_token:
+                    REFRESHES.inc(result='shared')
+                    return True
+            elif self.is_fresh(margin):
+                REFRESHES.inc(result='shared')
+                return True
+
+            try:
+                async with httpx.AsyncClient(timeout=httpx.Timeout(15, connect=5)) as client:
+                    response = await client.get(os.getenv('B24_BASE_URL') + '/oauth/token/', params={
+                        'grant_type': 'refresh_token',
+                        'client_id': os.getenv('CLIENT_ID'),
+                        'client_secret': os.getenv('B24_CLIENT_SECRET'),
+                        'refresh_token': self.refresh_token,
+                    })
+                response_data = response.json()
+            except Exception as e:
+                print(f"❌ Ошибка при запросе: {e}")
+                REFRESHES.inc(result='error')
+                return False
+
+            if response.status_code != 200 or 'access_token' not in response_data:
+                print(f"❌ Ошибка при обновлении токенов: {response_data}")
+                REFRESHES.inc(result='rejected')
+                return False
+
+            self.access_token = response_data['access_token']
+            self.refresh_token = response_data['refresh_token']
+            self.expires_at = time.time() + int(response_data.get('expires_in', 3600))
+
+            # Обновляем .env файл в пуле потоков: запись с fsync не должна останавливать event loop.
+            # Под блокировкой - чтобы записи двух обновлений не перемешались
+            await db_executor.run(update_env_file, self.access_token, self.refresh_token, self.expires_at)
+
+            REFRESHES.inc(result='success')
+            print("✅ Токены успешно обновлены!")
+            return True
+
+    async def refresh_job(self, context=None):
+        """Задача JobQueue: заранее обновляет токен, чтобы запросы пользователей не ждали"""
+        await self.get_access_token(margin=self.margin * 5)
\ No newline at end of file
@@ -1,7 +1,8 @@
 import os
+import tempfile
 
-def update_env_file(access_token, refresh_token):
-    """Обновляет токены в .env файле"""
+def update_env_file(access_token, refresh_token, expires_at=None):
+    """Обновляет токены в .env файле (атомарно: временный файл + rename)"""
     
     # Читаем текущий .env файл
     env_path = '.env'
@@ -16,6 +17,8 @@ def update_env_file(access_token, refresh_token):
         'CRM_TOKEN': access_token,
         'CRM_REFRESH': refresh_token
     }
+    if expires_at is not None:
+        tokens_updated['CRM_TOKEN_EXPIRES'] = str(int(expires_at))
     
     new_lines = []
     tokens_found = set()
@@ -37,10 +40,20 @@ def update_env_file(access_token, refresh_token):
         if token_key not in tokens_found:
             new_lines.append(f"{token_key}={token_value}\n")
     
-    # Записываем обратно в файл
-    with open(env_path, 'w', encoding='utf-8') as file:
-        file.writelines(new_lines)
+    # Пишем во временный файл рядом и подменяем .env одной операцией,
+    # чтобы сбой посреди записи не оставил файл без токенов
+    env_dir = os.path.dirname(os.path.abspath(env_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.env.', dir=env_dir)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.writelines(new_lines)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, env_path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
     
     # Также обновляем переменные окружения в текущей сессии
-    os.environ['CRM_TOKEN'] = access_token
-    os.environ['CRM_REFRESH'] = refresh_token
\ No newline at end of file
+    for token_key, token_value in tokens_updated.items():
+        os.environ[token_key] = token_value
\ No newline at end of file
@@ -0,0 +1,92 @@
+import csv
+import importlib.util
+import io
+import os
+import tempfile
+from datetime import date, timedelta
+from Class.Executor import db_executor
+from Class.Singleton import Singleton
+from Model.Session import Session
+
+class ExportService(Singleton):
+    """Выгрузка сессий таймеров за период в CSV или XLSX.
+
+    Строки читаются из БД пачками и сразу пишутся во временный файл, который
+    держится в памяти до EXPORT_SPOOL_BYTES, а дальше уходит на диск.
+    """
+    HEADER = ['Дата', 'Таймер', 'Задача', 'Комментарий', 'Начало', 'Конец', 'Минут', 'Итого по таймеру, минут']
+    MAX_FILE_BYTES = 50 * 1024 * 1024  # предел размера файла, который бот может отправить
+
+    def __init__(self):
+        self.session_model = Session.instance()
+        self.spool_bytes = int(os.getenv('EXPORT_SPOOL_BYTES', 1024 * 1024))
+        self.batch_size = int(os.getenv('EXPORT_BATCH', 500))
+
+    @property
+    def xlsx_available(self) -> bool:
+        # XLSX - если установлен openpyxl, CSV доступен всегда
+        return importlib.util.find_spec('openpyxl') is not None
+
+    async def export(self, user_id, date_from: date, date_to: date, fmt: str = 'csv'):
+        """Файл выгрузки за период (границы включительно): (файл, имя файла, строк).
+
+        Файл открыт и перемотан в начало, закрывает его вызывающий.
+        """
+        return await db_executor.run(self._export, user_id, date_from, date_to, fmt)
+
+    def _export(self, user_id, date_from, date_to, fmt):
+        if date_from > date_to:
+            date_from, date_to = date_to, date_from
+        rows = self._rows(user_id, date_from, date_to)
+        file = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        try:
+            count = self._write_xlsx(file, rows) if fmt == 'xlsx' else self._write_csv(file, rows)
+        except Exception:
+            file.close()
+            raise
+        file.seek(0)
+        return file, f"timers_{date_from:%Y%m%d}-{date_to:%Y%m%d}.{fmt}", count
+
+    def _rows(self, user_id, date_from, date_to):
+        sessions = self.session_model.iter_with_timers(
+            user_id, date_from.isoformat(), (date_to + timedelta(days=1)).isoformat(), self.batch_size
+        )
+        for row in sessions:
+            yield [
+                row['work_date'],
+                row['timer_name'],
+                row['task_id'] or '',
+                row['comment'] or '',
+                str(row['start_time'])[:19],
+                str(row['end_time'])[:19] if row['end_time'] else '',
+                round(row['duration_seconds'] / 60, 2) if row['duration_seconds'] is not None else '',
+                round(row['timer_seconds'] / 60, 2) if row['timer_seconds'] is not None else '',
+            ]
+
+    def _write_csv(self, file, rows) -> int:
+        # BOM и ';' - чтобы Excel с русской локалью открыл файл без мастера импорта
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        writer = csv.writer(text, delimiter=';')
+        writer.writerow(self.HEADER)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        text.flush()
+        text.detach()
+        return count
+
+    def _write_xlsx(self, file, rows) -> int:
+        # Импорт здесь: openpyxl грузится дольше, чем весь остальной бот без telegram
+        from openpyxl import Workbook
+
+        # write_only: openpyxl не держит лист в памяти, строки сбрасываются во временный файл
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Сессии')
+        sheet.append(self.HEADER)
+        count = 0
+        for row in rows:
+            sheet.append(row)
+            count += 1
+        workbook.save(file)
+        return count
\ No newline at end of file
@@ -0,0 +1,60 @@
+import os
+from Class.Executor import db_executor
+from Class.HttpServer import HttpServer
+from Class.Metrics import metrics
+from Class.Singleton import Singleton
+from Model.Session import Session
+from Model.Outbox import Outbox
+
+class MetricsService(Singleton):
+    """Метрики бота в текстовом формате Prometheus на локальном порту (GET /metrics).
+
+    Включается переменной METRICS_PORT. Задержки обработчиков, запросов моделей
+    и Битрикса копятся в Class.Metrics по ходу работы, а состояние (сессии,
+    очереди) снимается при каждом сборе.
+    """
+
+    def __init__(self):
+        port = os.getenv('METRICS_PORT')
+        self.enabled = bool(port)
+        self.server = HttpServer(os.getenv('METRICS_LISTEN', '127.0.0.1'), int(port or 0))
+        self.server.route('GET', '/metrics', self.handle_metrics)
+        self.session_model = Session.instance()
+        self.outbox_model = Outbox.instance()
+        self.processor = None
+
+    def register(self, app):
+        """Метрики состояния: запущенные таймеры, очередь Битрикса, очередь обновлений"""
+        metrics.gauge('tasktreker_active_sessions', 'Запущенные таймеры',
+                      callback=self.session_model.count_active)
+        metrics.gauge('tasktreker_b24_outbox_depth', 'Записи очереди отправки в Битрикс', ('status',),
+                      callback=self.outbox_model.status_counts)
+        metrics.gauge('tasktreker_update_queue_depth', 'Обновления Telegram, ещё не взятые в обработку',
+                      callback=app.update_queue.qsize)
+
+        # Состояние обработчика обновлений меняется в event loop - его снимаем там же, в handle_metrics
+        self.processor = app.update_processor if hasattr(app.update_processor, 'stats') else None
+        self.updates_gauge = metrics.gauge('tasktreker_updates_in_progress',
+                                           'Обновления в обработке и в очереди пользователей', ('state',))
+        self.lag_gauge = metrics.gauge('tasktreker_update_max_lag_seconds',
+                                       'Наибольшая задержка начала обработки среди недавних пользователей')
+
+    async def start(self, app):
+        if not self.enabled:
+            return
+        self.register(app)
+        await self.server.start()
+        print(f"📈 Метрики: http://{self.server.host}:{self.server.port}/metrics")
+
+    async def stop(self):
+        await self.server.stop()
+
+    async def handle_metrics(self, headers, body):
+        if self.processor is not None:
+            stats = self.processor.stats(top=1)
+            self.updates_gauge.set(stats['running'], state='running')
+            self.updates_gauge.set(stats['waiting'], state='waiting')
+            self.lag_gauge.set(max((lag['max'] for lag in stats['lag_seconds'].values()), default=0))
+        # Часть метрик читается из БД - собираем в пуле потоков
+        text = await db_executor.run(metrics.render)
+        return 200, 'text/plain; version=0.0.4; charset=utf-8', text.encode()
\ No newline at end of file
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from Class.Executor import db_executor
+from Class.QueryLog import query_log
+from Class.Singleton import Singleton
+from Services.B24Service import B24Service
+from Model.Outbox import Outbox
+from Model.Timer import Timer
+
+class OutboxService(Singleton):
+    """Фоновая отправка очереди b24_outbox в Битрикс с повторами"""
+    REPORT_TITLES = [('tracked', "✅ Успешно отправлены:"), ('updated', "🔄 Обновлены:"),
+                     ('retry', "⏳ Не отправлены, повторим позже:"), ('failed', "❌ Ошибки отправки:")]
+
+    def __init__(self):
+        self.b24 = B24Service.instance()
+        self.outbox_model = Outbox.instance()
+        self.timer_model = Timer.instance()
+        self.interval = int(os.getenv('OUTBOX_INTERVAL', 10))
+        self.max_attempts = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+        self.max_backoff = int(os.getenv('OUTBOX_MAX_BACKOFF', 3600))
+        self.live_ttl = int(os.getenv('OUTBOX_LIVE_TTL', 900))
+        self.live_messages = {}  # user_id -> [LiveMessage, {таймер: итог}, время привязки]
+        self._lock = asyncio.Lock()
+
+    def schedule(self, job_queue):
+        """Регистрация обработчика очереди в JobQueue приложения"""
+        job_queue.run_repeating(self.drain, interval=self.interval, first=1, name='b24_outbox')
+
+    async def kick(self, context):
+        """Внеочередной запуск обработчика (сразу после постановки в очередь)"""
+        if context.job_queue:
+            context.job_queue.run_once(self.drain, when=0)
+        else:
+            # Без JobQueue фонового обработчика нет - отправляем сразу
+            await self.drain(context)
+
+    def attach_progress(self, user_id, live):
+        """Итоги отправки пользователя дописываются в сообщение хода отчёта, а не приходят отдельно"""
+        self.live_messages[user_id] = [live, {}, time.monotonic()]
+
+    async def enqueue(self, user_id, b24_user_id, timers):
+        await db_executor.run(self.outbox_model.enqueue, user_id, b24_user_id, timers)
+
+    async def recover(self):
+        await db_executor.run(self.outbox_model.recover)
+
+    async def drain(self, context):
+        """Задача JobQueue: отправляет всё, что пора отправить, и уведомляет пользователей"""
+        # Запуски по расписанию и внеочередные не должны работать одновременно
+        if self._lock.locked():
+            return
+        async with self._lock:
+            while True:
+                # Отправка может быть запущена из обработчика отчёта, но забирает очередь всех
+                # пользователей: запросы каждой пачки - отдельное действие, не действие обработчика
+                with query_log.action('OutboxService.drain', detached=True):
+                    rows = await db_executor.run(self.outbox_model.claim)
+                    if not rows:
+                        return
+                    report = await self._send(rows)
+                await self._notify(context.bot, report)
+
+    async def _send(self, rows):
+        """Отправка пачки записей очереди через batch. Возвращает итоги по пользователям"""
+        found, unresolved = await self._reconcile([
+            row for row in rows if row['action'] == 'add' and row['unconfirmed_seconds'] is not None
+        ])
+        commands = {}
+        for row in rows:
+            if row['id'] in unresolved:
+                continue
+            # Неподтверждённое добавление, найденное в Битриксе, - уже обновление
+            report_id = row['report_id'] if row['action'] == 'update' else found.get(row['id'])
+            if report_id:
+                commands[f"o{row['id']}"] = self.b24.updateTimeCommand(
+                    row['task_id'], report_id, row['seconds'], row['comment']
+                )
+            else:
+                commands[f"o{row['id']}"] = self.b24.addTimeCommand(
+                    row['task_id'], row['b24_user_id'], row['seconds'], row['comment']
+                )
+
+        try:
+            results, batch_errors, unknown = await self.b24.batch(commands)
+        except Exception as e:
+            results, batch_errors, unknown = {}, {key: str(e) for key in commands}, set(commands)
+        errors = {f"o{outbox_id}": error for outbox_id, error in unresolved.items()}
+        errors.update(batch_errors)
+
+        report = {}
+        done, failures = [], []
+        for row in rows:
+            key = f"o{row['id']}"
+            user_report = report.setdefault(row['user_id'], {'tracked': [], 'updated': [], 'retry': [], 'failed': []})
+            if key in results:
+                done.append((row, found.get(row['id']) or results[key]))
+                user_report['tracked' if row['action'] == 'add' else 'updated'].append(row['timer_name'])
+            else:
+                give_up = row['attempts'] >= self.max_attempts
+                retry_at = datetime.now() + timedelta(seconds=min(30 * 2 ** row['attempts'], self.max_backoff))
+                # Добавление без ответа могло пройти: повтор сначала поищет запись в Битриксе
+                unconfirmed = row['action'] == 'add' and key in unknown and row['id'] not in found
+                failures.append((row, str(errors.get(key)), retry_at, give_up, unconfirmed))
+                user_report['failed' if give_up else 'retry'].append(row['timer_name'])
+
+        if failures:
+            await db_executor.run(self.outbox_model.reschedule, failures)
+        if done:
+            await db_executor.run(self._complete, done)
+        return report
+
+    async def _reconcile(self, rows):
+        """Поиск в Битриксе записей неподтверждённых добавлений (те же секунды и комментарий).
+
+        Возвращает ({id записи очереди: id найденной записи}, {id записи очереди: ошибка
+        поиска}). Не найденное отправляется обычным добавлением, а при ошибке поиска
+        запись ждёт следующей попытки: повторять добавление вслепую нельзя.
+        """
+        if not rows:
+            return {}, {}
+        commands = {
+            f"c{row['id']}": self.b24.findTimeCommand(
+                row['task_id'], row['b24_user_id'],
+                # Дата записи в Битриксе - в его часовом поясе, берём с запасом в сутки
+                (datetime.fromisoformat(str(row['created_at'])) - timedelta(days=1)).strftime('%Y-%m-%d')
+            )
+            for row in rows
+        }
+        try:
+            results, errors, _ = await self.b24.batch(commands)
+        except Exception as e:
+            results, errors = {}, {key: str(e) for key in commands}
+
+        # Запись, уже привязанная к таймеру (или найденная для другой строки), не подходит
+        taken = await db_executor.run(self.timer_model.linked_report_ids, {
+            int(item['ID']) for items in results.values() for item in items or []
+        })
+        found, failed = {}, {}
+        for row in rows:
+            key = f"c{row['id']}"
+            if key not in results:
+                failed[row['id']] = f"проверка добавления: {errors.get(key)}"
+                continue
+            for item in results[key] or []:
+                if (int(item['ID']) not in taken
+                        and abs(float(item.get('SECONDS') or 0) - row['unconfirmed_seconds']) < 1
+                        and (item.get('COMMENT_TEXT') or '') == (row['unconfirmed_comment'] or '')):
+                    found[row['id']] = int(item['ID'])
+                    taken.add(found[row['id']])
+                    break
+        return found, failed
+
+    def _complete(self, done):
+        """Сохраняет report_id новых записей и отправленные значения, убирает отправленное из очереди.
+
+        Всё одной транзакцией.
+        """
+        added = [(row, report_id) for row, report_id in done if row['action'] == 'add']
+        now = datetime.now()
+        with self.outbox_model.transaction():
+            self.timer_model.update_many([
+                {"id": row['timer_id'], "report_id": report_id} for row, report_id in added
+            ])
+            # По ним следующий отчёт пропустит таймеры, которые с тех пор не менялись
+            self.timer_model.update_many([
+                {"id": row['timer_id'], "synced_seconds": row['seconds'], "synced_comment": row['comment'], "synced_at": now}
+                for row, _ in done
+            ])
+            self.outbox_model.promote_pending_adds([(row['timer_id'], report_id) for row, report_id in added])
+            self.outbox_model.complete([row['id'] for row, _ in done])
+
+    def _format_report(self, user_report):
+        result_message = ["📊 **Итог отправки в Битрикс:**"]
+        for key, title in self.REPORT_TITLES:
+            if user_report[key]:
+                result_message.append(title)
+                result_message.extend(f"  • {name}" for name in user_report[key])
+        return "\n".join(result_message)
+
+    async def _notify(self, bot, report):
+        for user_id, user_report in report.items():
+            attached = self.live_messages.get(user_id)
+            if attached and time.monotonic() - attached[2] < self.live_ttl:
+                # Последний итог по каждому таймеру: повтор, а потом успех - это успех
+                live, statuses, _ = attached
+                for key, _ in self.REPORT_TITLES:
+                    statuses.update((name, key) for name in user_report[key])
+                live.set('bitrix', self._format_report({
+                    key: [name for name, status in statuses.items() if status == key] for key, _ in self.REPORT_TITLES
+                }))
+                continue
+
+            self.live_messages.pop(user_id, None)
+            try:
+                await bot.send_message(chat_id=user_id, text=self._format_report(user_report))
+            except Exception as e:
+                print(f"❌ Не удалось уведомить пользователя {user_id}: {e}")
\ No newline at end of file
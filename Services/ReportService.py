@@ -1,20 +1,27 @@
-from Services.B24Service import B24Service
+from datetime import date
+from Class.Executor import db_executor
+from Class.LiveMessage import LiveMessage
+from Class.Singleton import Singleton
+from Services.OutboxService import OutboxService
 from Model.User import User
 from Model.Timer import Timer
+from Model.DailyTotal import DailyTotal
 from telegram import Update
 from telegram.ext import ContextTypes
 
-class ReportService:
+class ReportService(Singleton):
     def __init__(self):
-        self.b24 = B24Service()
-        self.user_model = User()
-        self.timer_model = Timer()
+        self.outbox = OutboxService.instance()
+        self.user_model = User.instance()
+        self.timer_model = Timer.instance()
+        self.daily_total_model = DailyTotal.instance()
+        self.progress = {}  # user_id -> LiveMessage хода текущего отчёта
 
     async def tracker_all_timer(self, user_id, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Трекает все таймеры с запросом недостающих данных"""
         # Получаем таймеры через модель
-        today_timers = self.timer_model.get_today_timers(user_id)
-        user_data = self.user_model.get_user_by_id(user_id)
+        today_timers = await self.timer_model.aget_today_timers(user_id)
+        user_data = await self.user_model.aget_user_by_id(user_id)
 
         if not today_timers:
             return "На сегодня нет активных таймеров"
@@ -22,12 +29,30 @@ class ReportService:
         if not user_data or not user_data.get('b24_id'):
             return "У вас нет доступа в Битрикс"
 
+        # Таймеры с задачей и комментарием сразу ставим в очередь отправки, кроме тех,
+        # что уже отправлены в Битрикс в том же виде; в диалог попадают только те,
+        # для которых нужен ввод пользователя
+        ready_timers = [t for t in today_timers if t.get('task_id') and t.get('comment')]
+        synced_timers = [t for t in ready_timers if self._is_synced(t)]
+        ready_timers = [t for t in ready_timers if t not in synced_timers]
+
         # Сохраняем состояние для диалога
-        context.user_data['pending_timers'] = today_timers
+        context.user_data['pending_timers'] = [
+            t for t in today_timers if t not in ready_timers and t not in synced_timers
+        ]
         context.user_data['current_timer_index'] = 0
         context.user_data['user_b24_id'] = user_data['b24_id']
-        context.user_data['tracked_timers'] = []
+        context.user_data['queued_timers'] = []
         context.user_data['error_timers'] = []
+        context.user_data['synced_timers'] = [t['name'] for t in synced_timers]
+        context.user_data['total_timers'] = len(today_timers)
+
+        # Ход отчёта и итог отправки в Битрикс - в одном сообщении, которое редактируется
+        live = await LiveMessage.send(update.message, 'report', f"📊 Отчёт: таймеров {len(today_timers)}")
+        self._attach_progress(user_id, context, live)
+
+        await self._enqueue(update, context, ready_timers)
+        self._show_progress(update, context)
 
         # Начинаем диалог
         await self._process_next_timer(update, context)
@@ -47,11 +72,12 @@ class ReportService:
         context.user_data['current_timer'] = timer
         
         # Получаем актуальные данные из БД
-        current_timer = self.timer_model.get_timer(update.effective_user.id, timer['name'])
+        current_timer = await self.timer_model.aget_timer(update.effective_user.id, timer['name'])
         
         # Проверяем, что таймер найден
         if not current_timer:
-            await update.message.reply_text(f"❌ Таймер \"{timer['name']}\" не найден в базе данных. Пропускаем.")
+            context.user_data.setdefault('error_timers', []).append(f"{timer['name']} (не найден, пропущен)")
+            self._show_progress(update, context)
             # Переходим к следующему таймеру
             context.user_data['current_timer_index'] += 1
             await self._process_next_timer(update, context)
@@ -75,61 +101,37 @@ class ReportService:
             # Все данные есть, отправляем в Битрикс
             await self._send_to_bitrix(update, context, current_timer)
 
+    def _is_synced(self, timer) -> bool:
+        """Таймер уже в Битриксе с тем же временем (с точностью до секунды) и комментарием"""
+        return (
+            bool(timer.get('report_id'))
+            and timer.get('synced_seconds') is not None
+            and round(timer['synced_seconds']) == round(timer['total_seconds'])
+            and timer.get('synced_comment') == timer.get('comment')
+        )
+
+    async def _enqueue(self, update: Update, context: ContextTypes.DEFAULT_TYPE, timers):
+        """Ставит таймеры в очередь отправки в Битрикс и будит обработчик очереди"""
+        if not timers:
+            return
+
+        await self.outbox.enqueue(update.effective_user.id, context.user_data['user_b24_id'], timers)
+        context.user_data.setdefault('queued_timers', []).extend(timer['name'] for timer in timers)
+        await self.outbox.kick(context)
+
     async def _send_to_bitrix(self, update: Update, context: ContextTypes.DEFAULT_TYPE, timer=None):
-        """Отправляет или обновляет таймер в Битрикс"""
+        """Ставит таймер в очередь отправки или обновления в Битрикс"""
         if timer is None:
             timer = context.user_data['current_timer']
         
-        user_b24_id = context.user_data['user_b24_id']
-        
-        if 'tracked_timers' not in context.user_data:
-            context.user_data['tracked_timers'] = []
-        if 'updated_timers' not in context.user_data:
-            context.user_data['updated_timers'] = []
-        if 'error_timers' not in context.user_data:
-            context.user_data['error_timers'] = []
-
         try:
-            if not timer.get('report_id'):
-                # Создаем новый отчёт
-                report_id = self.b24.addTime(
-                    timer['task_id'], 
-                    user_b24_id, 
-                    timer['total_seconds'], 
-                    timer.get('comment', '')
-                )
-                
-                if report_id:
-                    # Сохраняем report_id в БД
-                    self.timer_model.update(
-                        {"report_id": report_id},
-                        {"user_id": update.effective_user.id, "name": timer['name']}
-                    )
-                    context.user_data['tracked_timers'].append(timer['name'])
-                    await update.message.reply_text(f"✅ Таймер \"{timer['name']}\" успешно отправлен в Битрикс (ID: {report_id})")
-                else:
-                    context.user_data['error_timers'].append(timer['name'])
-                    await update.message.reply_text(f"❌ Ошибка отправки таймера \"{timer['name']}\"")
-                    
+            if self._is_synced(timer):
+                context.user_data.setdefault('synced_timers', []).append(timer['name'])
             else:
-                # Обновляем существующий отчёт
-                success = self.b24.updateTime(
-                    timer['task_id'],
-                    timer['report_id'],
-                    timer['total_seconds'],
-                    timer.get('comment', '')
-                )
-                
-                if success:
-                    context.user_data['updated_timers'].append(timer['name'])
-                    await update.message.reply_text(f"✅ Таймер \"{timer['name']}\" успешно обновлен в Битрикс")
-                else:
-                    context.user_data['error_timers'].append(timer['name'])
-                    await update.message.reply_text(f"❌ Ошибка обновления таймера \"{timer['name']}\"")
-                    
+                await self._enqueue(update, context, [timer])
         except Exception as e:
-            context.user_data['error_timers'].append(timer['name'])
-            await update.message.reply_text(f"❌ Ошибка обработки таймера \"{timer['name']}\": {str(e)}")
+            context.user_data.setdefault('error_timers', []).append(f"{timer['name']} ({e})")
+        self._show_progress(update, context)
         
         # Переходим к следующему таймеру
         context.user_data['current_timer_index'] += 1
@@ -137,14 +139,20 @@ class ReportService:
 
     async def _finish_tracking(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Завершает процесс трекинга и выводит итог"""
-        tracked = context.user_data['tracked_timers']
+        queued = context.user_data['queued_timers']
         errors = context.user_data['error_timers']
+        synced = context.user_data.get('synced_timers', [])
         
         result_message = ["📊 **Итог трекинга:**"]
         
-        if tracked:
-            result_message.append("✅ Успешно отправлены:")
-            for name in tracked:
+        if queued:
+            result_message.append("📨 Поставлены в очередь отправки:")
+            for name in queued:
+                result_message.append(f"  • {name}")
+        
+        if synced:
+            result_message.append("✔️ Уже актуальны в Битриксе, не отправлялись:")
+            for name in synced:
                 result_message.append(f"  • {name}")
         
         if errors:
@@ -152,25 +160,81 @@ class ReportService:
             for name in errors:
                 result_message.append(f"  • {name}")
         
-        if not tracked and not errors:
+        live = self._get_progress(update, context)
+        if not queued and not errors and not synced:
             result_message.append("ℹ️ Нет таймеров для отправки")
+        elif live is None and queued:
+            result_message.append("\nРезультат отправки в Битрикс придёт отдельным сообщением")
         
-        await update.message.reply_text(
-            "\n".join(result_message),
-            reply_markup=self.get_reply_keyboard(update.effective_user.id)
-        )
+        if live is None:
+            await update.message.reply_text(
+                "\n".join(result_message),
+                reply_markup=await self.get_reply_keyboard(update.effective_user.id)
+            )
+        else:
+            # Итог - в то же сообщение; результат отправки в Битрикс допишет OutboxService
+            live.sections['report'] = "\n".join(result_message)
+            await live.flush()
+            keyboard = await self.get_reply_keyboard(update.effective_user.id, only_changed=True)
+            if keyboard:
+                await update.message.reply_text("⌨️ Клавиатура обновлена", reply_markup=keyboard)
+        self.progress.pop(update.effective_user.id, None)
         
         # Очищаем временные данные
         for key in ['pending_timers', 'current_timer_index', 'user_b24_id', 
-                    'tracked_timers', 'error_timers', 'current_timer',
-                    'awaiting_task_id', 'awaiting_comment']:
+                    'queued_timers', 'error_timers', 'current_timer',
+                    'awaiting_task_id', 'awaiting_comment', 'total_timers', 'progress_message',
+                    'synced_timers']:
             context.user_data.pop(key, None)
+    
+    def _attach_progress(self, user_id, context: ContextTypes.DEFAULT_TYPE, live: LiveMessage):
+        self.progress[user_id] = live
+        self.outbox.attach_progress(user_id, live)
+        # В состоянии диалога - только id сообщения: после перезапуска бота правки продолжатся
+        context.user_data['progress_message'] = [live.chat_id, live.message_id]
+    
+    def _get_progress(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Сообщение хода отчёта (None для диалога, начатого до появления таких сообщений)"""
+        user_id = update.effective_user.id
+        ids = context.user_data.get('progress_message')
+        live = self.progress.get(user_id)
+        if ids and (live is None or [live.chat_id, live.message_id] != list(ids)):
+            live = LiveMessage(context.bot, *ids)
+            self._attach_progress(user_id, context, live)
+        return live if ids else None
+    
+    def _show_progress(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ход отчёта в сообщении прогресса (правка с троттлингом)"""
+        live = self._get_progress(update, context)
+        if live is None:
+            return
+        queued = context.user_data.get('queued_timers', [])
+        errors = context.user_data.get('error_timers', [])
+        synced = context.user_data.get('synced_timers', [])
+        total = context.user_data.get('total_timers', 0)
+        lines = [f"📊 Отчёт: обработано {len(queued) + len(errors) + len(synced)} из {total}"]
+        if queued:
+            lines.append(f"📨 В очереди: {', '.join(queued)}")
+        if synced:
+            lines.append(f"✔️ Уже актуальны: {', '.join(synced)}")
+        if errors:
+            lines.append(f"❌ Ошибки: {', '.join(errors)}")
+        live.set('report', "\n".join(lines))
 
-    def get_reply_keyboard(self, user_id):
+    async def get_reply_keyboard(self, user_id, only_changed=False):
         """Получение клавиатуры с кнопками"""
         # Импортируем TimerService здесь, чтобы избежать циклического импорта
         from Services.TimerService import TimerService
-        return TimerService().get_reply_keyboard(user_id)
+        return await TimerService.instance().get_reply_keyboard(user_id, only_changed)
+
+    def _update_timer(self, user_id, timer_name, values):
+        """Изменение сегодняшнего таймера вместе с его строкой дневных итогов (задача, категория)"""
+        today = date.today().isoformat()
+        with self.timer_model.transaction():
+            if not self.timer_model.update(values, {"user_id": user_id, "work_date": today, "name": timer_name}):
+                return False
+            self.daily_total_model.refresh(user_id, timer_name, work_date=today)
+            return True
 
     # Обработчики для ответов пользователя
     async def handle_task_id_response(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -185,10 +249,7 @@ class ReportService:
             timer_name = context.user_data['current_timer']['name']
             
             # Обновляем task_id в базе данных
-            success = self.timer_model.update(
-                {"task_id": task_id},
-                {"user_id": user_id, "name": timer_name}
-            )
+            success = await db_executor.run(self._update_timer, user_id, timer_name, {"task_id": task_id})
             
             if success:
                 await update.message.reply_text(f"✅ ID задачи для \"{timer_name}\" установлен: {task_id}")
@@ -197,7 +258,7 @@ class ReportService:
                 context.user_data['current_timer']['task_id'] = task_id
                 
                 # Проверяем, нужен ли еще комментарий
-                current_timer = self.timer_model.get_timer(user_id, timer_name)  # Используем user_id
+                current_timer = await self.timer_model.aget_timer(user_id, timer_name)  # Используем user_id
                 if current_timer and not current_timer.get('comment'):
                     await update.message.reply_text(
                         f"❓ Теперь введите комментарий для таймера \"{timer_name}\":"
@@ -228,10 +289,7 @@ class ReportService:
         timer_name = context.user_data['current_timer']['name']
         
         # Обновляем комментарий в базе данных
-        success = self.timer_model.update(
-            {"comment": comment},
-            {"user_id": user_id, "name": timer_name}
-        )
+        success = await db_executor.run(self._update_timer, user_id, timer_name, {"comment": comment})
         
         if success:
             await update.message.reply_text(f"✅ Комментарий для \"{timer_name}\" сохранен")
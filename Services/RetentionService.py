@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta
+from Class.Executor import db_executor
+from Class.Singleton import Singleton
+from Model.DailyTotal import DailyTotal
+from Model.Session import Session
+from Model.Timer import Timer
+
+class RetentionService(Singleton):
+    """Перенос старой истории из рабочей базы в архивную.
+
+    Закрытые сессии и таймеры старше RETENTION_DAYS дней пачками переносятся
+    в архивную базу (archive.<таблица> в любом запросе). Дневные итоги остаются
+    в рабочей базе, поэтому статистика за старые периоды не меняется.
+    Освободившиеся страницы возвращаются инкрементальным VACUUM.
+    """
+
+    def __init__(self):
+        self.days = int(os.getenv('RETENTION_DAYS', 0))  # 0 - по расписанию не запускается
+        self.batch_size = int(os.getenv('RETENTION_BATCH', 1000))
+        self.vacuum_pages = int(os.getenv('RETENTION_VACUUM_PAGES', 0))  # 0 - все свободные страницы
+        self.run_at = datetime.strptime(os.getenv('RETENTION_TIME', '03:30'), '%H:%M').time()
+        self.timer_model = Timer.instance()
+        self.session_model = Session.instance()
+        self.daily_total_model = DailyTotal.instance()
+        self._lock = asyncio.Lock()
+
+    def schedule(self, job_queue):
+        """Ежедневный запуск в RETENTION_TIME по местному времени"""
+        if self.days <= 0:
+            return
+        run_at = self.run_at.replace(tzinfo=datetime.now().astimezone().tzinfo)
+        job_queue.run_daily(self.run_job, time=run_at, name='retention')
+
+    async def run_job(self, context):
+        try:
+            await self.run()
+        except Exception as e:
+            print(f"❌ Ошибка архивирования истории: {e}")
+
+    async def run(self, days: int = None):
+        """Архивирование истории старше days дней (по умолчанию RETENTION_DAYS)"""
+        days = days or self.days
+        if days <= 0:
+            return None
+
+        async with self._lock:
+            started = time.perf_counter()
+            cutoff = (date.today() - timedelta(days=days)).isoformat()
+
+            # Итоги за архивируемые дни должны быть в daily_totals до переноса таймеров и сессий
+            await db_executor.run(self.daily_total_model.backfill, cutoff)
+            sessions = await self._archive(self.session_model, 'end_time IS NOT NULL AND end_time < ?', [cutoff])
+            # Таймеры с неотправленным в Битрикс временем остаются, пока очередь их не отпустит
+            timers = await self._archive(self.timer_model, '''
+                work_date < ? AND NOT EXISTS (SELECT 1 FROM b24_outbox o WHERE o.timer_id = timers.id)
+            ''', [cutoff])
+            freed = await db_executor.run(self._vacuum)
+
+            result = {'cutoff': cutoff, 'sessions': sessions, 'timers': timers, 'freed_pages': freed}
+            print(f"🗄 История до {cutoff} перенесена в архив: сессий {sessions}, таймеров {timers}, "
+                  f"освобождено страниц {freed} за {time.perf_counter() - started:.1f} с")
+            return result
+
+    async def _archive(self, model, condition, params):
+        """Перенос пачками: между пачками блокировку записи получают обработчики бота"""
+        total = 0
+        while True:
+            moved = await db_executor.run(model.archive, condition, params, self.batch_size)
+            total += moved
+            if moved < self.batch_size:
+                return total
+            await asyncio.sleep(0.05)
+
+    def _vacuum(self):
+        """Возврат свободных страниц файлу базы. Возвращает число освобождённых страниц"""
+        model = self.session_model
+        free = model.execute_custom_query('PRAGMA main.freelist_count')[0]['freelist_count']
+        if model.execute_custom_query('PRAGMA main.auto_vacuum')[0]['auto_vacuum'] != 2:
+            # База создана до включения auto_vacuum: режим меняется только полным VACUUM, один раз
+            print("🧹 Перевод базы на инкрементальный VACUUM (полная перезапись файла, один раз)...")
+            model.execute_custom_query('PRAGMA main.auto_vacuum = INCREMENTAL')
+            model.execute_custom_query('VACUUM main')
+            return free
+
+        pages = min(free, self.vacuum_pages) if self.vacuum_pages else free
+        if pages:
+            # Прагма освобождает по странице за шаг, execute делает только первый шаг
+            model.database.connection().executescript(f'PRAGMA main.incremental_vacuum({pages})')
+        return pages
\ No newline at end of file
@@ -0,0 +1,88 @@
+from datetime import date, datetime, timedelta
+from Class.Executor import db_executor
+from Class.Singleton import Singleton
+from Model.DailyTotal import DailyTotal
+
+class StatisticsService(Singleton):
+    """Статистика за неделю, месяц и произвольный период по дневным итогам"""
+    WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+    MAX_DAYS = 366
+    TOP_TIMERS = 15
+
+    def __init__(self):
+        self.daily_total_model = DailyTotal.instance()
+
+    async def get_week(self, user_id):
+        """Статистика за текущую неделю"""
+        today = date.today()
+        return await self.get_range(user_id, today - timedelta(days=today.weekday()), today, "за неделю")
+
+    async def get_month(self, user_id):
+        """Статистика за текущий месяц"""
+        today = date.today()
+        return await self.get_range(user_id, today.replace(day=1), today, "за месяц")
+
+    async def get_range(self, user_id, date_from: date, date_to: date, title: str = None):
+        """Статистика за период (границы включительно)"""
+        return await db_executor.run(self._get_range, user_id, date_from, date_to, title)
+
+    def parse_date(self, value: str) -> date:
+        """Дата из аргумента команды: 31.12.2025, 31.12 (текущий год) или 2025-12-31"""
+        for fmt in ('%d.%m.%Y', '%Y-%m-%d'):
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                pass
+        return datetime.strptime(f'{value}.{date.today().year}', '%d.%m.%Y').date()
+
+    def _format_hours(self, seconds):
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        return f"{seconds / 3600:.2f}h ({hours}h {minutes}m)"
+
+    def _get_range(self, user_id, date_from, date_to, title):
+        if date_from > date_to:
+            date_from, date_to = date_to, date_from
+        if (date_to - date_from).days >= self.MAX_DAYS:
+            return f"Период слишком большой, максимум {self.MAX_DAYS} дней"
+
+        period = f"{date_from:%d.%m.%Y} - {date_to:%d.%m.%Y}"
+        rows = self.daily_total_model.get_range(user_id, date_from.isoformat(), date_to.isoformat())
+        if not rows:
+            return f"За период {period} нет учтённого времени"
+
+        # Итоги уже дневные - остаётся свести несколько сотен строк
+        by_day, by_category, by_timer = {}, {}, {}
+        total_seconds = 0
+        for row in rows:
+            seconds = row['seconds']
+            total_seconds += seconds
+            by_day[row['work_date']] = by_day.get(row['work_date'], 0) + seconds
+            category = row['category'] or 'другое'
+            by_category[category] = by_category.get(category, 0) + seconds
+            key = (row['timer_name'], row['task_id'])
+            by_timer[key] = by_timer.get(key, 0) + seconds
+
+        result = [f"📊 Статистика {title or 'за период'} ({period}):", "", "📅 По дням:"]
+        for work_date, seconds in by_day.items():
+            day = date.fromisoformat(work_date)
+            result.append(f"  {self.WEEKDAYS[day.weekday()]} {day:%d.%m} - {self._format_hours(seconds)}")
+
+        result.extend(["", "🏷 По категориям:"])
+        for category, seconds in sorted(by_category.items(), key=lambda item: item[1], reverse=True):
+            result.append(f"  {category} - {self._format_hours(seconds)}")
+
+        result.extend(["", "⏱ По таймерам:"])
+        timers = sorted(by_timer.items(), key=lambda item: item[1], reverse=True)
+        for (timer_name, task_id), seconds in timers[:self.TOP_TIMERS]:
+            task = f" (задача {task_id})" if task_id else ""
+            result.append(f"  [{timer_name}]{task} - {self._format_hours(seconds)}")
+        if len(timers) > self.TOP_TIMERS:
+            result.append(f"  ... и ещё {len(timers) - self.TOP_TIMERS}")
+
+        result.extend([
+            "",
+            f"📈 **Всего: {self._format_hours(total_seconds)}**",
+            f"В среднем за рабочий день: {self._format_hours(total_seconds / len(by_day))}",
+        ])
+        return "\n".join(result)
\ No newline at end of file
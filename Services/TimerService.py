@@ -1,174 +1,244 @@
+import os
 from datetime import datetime
+from functools import lru_cache
+from telegram import KeyboardButton, ReplyKeyboardMarkup
+from Class.Executor import db_executor
+from Class.Singleton import Singleton
+from Services.UserStateCache import UserStateCache
 from Services.B24Service import B24Service
 from Model.User import User
 from Model.Timer import Timer
 from Model.Session import Session
+from Model.DailyTotal import DailyTotal
 
-class TimerService:
+@lru_cache(maxsize=1024)
+def build_keyboard(labels):
+    """Разметка клавиатуры для набора кнопок (одинаковые наборы разделяют один объект)"""
+    return ReplyKeyboardMarkup([[KeyboardButton(label)] for label in labels], resize_keyboard=True)
+
+class TimerService(Singleton):
     def __init__(self):
-        self.b24 = B24Service()
-        self.user_model = User()
-        self.timer_model = Timer()
-        self.session_model = Session()
+        # Кэш таймеров на сегодня и активных сессий пользователя. Создаётся вместе с
+        # сервисом (TimerService.instance()), когда .env уже загружен
+        self.state_cache = UserStateCache(int(os.getenv('STATE_CACHE_SIZE', 1000)))
+        self.b24 = B24Service.instance()
+        self.user_model = User.instance()
+        self.timer_model = Timer.instance()
+        self.session_model = Session.instance()
+        self.daily_total_model = DailyTotal.instance()
     
-    def get_reply_keyboard(self, user_id):
-        from telegram import KeyboardButton, ReplyKeyboardMarkup
-        
+    # Публичные методы асинхронные: вся работа с БД выполняется в пуле потоков,
+    # чтобы не блокировать event loop бота
+    async def get_reply_keyboard(self, user_id, only_changed=False):
+        """Получение клавиатуры с кнопками (None, если у пользователя уже такая же)"""
+        return await db_executor.run(self._get_reply_keyboard, user_id, only_changed)
+    
+    async def start_timer(self, user_id, timer_name):
+        """Запуск таймера"""
+        return await db_executor.run(self._start_timer, user_id, timer_name)
+    
+    async def stop_timer(self, user_id, timer_name):
+        """Остановка таймера"""
+        return await db_executor.run(self._stop_timer, user_id, timer_name)
+    
+    async def create_timer(self, user_id, key, task_id, timer_type):
+        """Создание таймера"""
+        return await db_executor.run(self._create_timer, user_id, key, task_id, timer_type)
+    
+    async def add_minutes(self, user_id, timer_name, minutes):
+        """Добавление времени к таймеру"""
+        return await db_executor.run(self._add_minutes, user_id, timer_name, minutes)
+    
+    async def delete_timer(self, user_id, timer_name):
+        """Удаление таймера"""
+        return await db_executor.run(self._delete_timer, user_id, timer_name)
+    
+    async def get_statistics(self, user_id):
+        """Статистика по сегодняшним таймерам"""
+        return await db_executor.run(self._get_statistics, user_id)
+    
+    async def clear_all_timers(self, user_id):
+        """Остановка всех таймеров пользователя"""
+        return await db_executor.run(self._clear_all_timers, user_id)
+    
+    def _get_state(self, user_id):
+        """Состояние пользователя на сегодня из кэша или из БД"""
+        state = self.state_cache.get(user_id)
+        if state is None:
+            generation = self.state_cache.generation(user_id)
+            state = {
+                'timers': {timer['name']: timer for timer in self.timer_model.get_today_timers(user_id)},
+                'active_sessions': self.session_model.get_active_sessions(user_id),
+            }
+            self.state_cache.put(user_id, state, generation)
+        return state
+    
+    def _get_reply_keyboard(self, user_id, only_changed=False):
         buttons = []
-        stats_button = [KeyboardButton("📊 Статистика")]
         
-        # Получаем активные сессии напрямую из БД
-        active_sessions = self.session_model.get_active_sessions(user_id)
+        state = self._get_state(user_id)
+        active_sessions = state['active_sessions']
         
         if bool(active_sessions):
             # Показываем только кнопку остановки активного таймера
             for session in active_sessions:
-                buttons.append([KeyboardButton(f"⏹️ Стоп {session['timer_name']}")])
+                buttons.append(f"⏹️ Стоп {session['timer_name']}")
                 break  # Только один активный таймер
         else:
             # Показываем кнопки старта для всех сегодняшних таймеров пользователя
-            today_timers = self.timer_model.get_today_timers(user_id)
-            for timer in today_timers:
-                buttons.append([KeyboardButton(f"▶️ Старт {timer['name']}")])
-            buttons.append([KeyboardButton(f"Отчёт")])
+            for timer in state['timers'].values():
+                buttons.append(f"▶️ Старт {timer['name']}")
+            buttons.append("Отчёт")
         
-        return ReplyKeyboardMarkup(buttons + [stats_button], resize_keyboard=True)
+        labels = tuple(buttons + ["📊 Статистика"])
+        
+        # Клавиатура в Telegram остаётся до замены, поэтому ту же самую не отправляем повторно.
+        # Последняя отправленная живёт в кэше состояния и сбрасывается вместе с ним
+        if only_changed and state.get('keyboard') == labels:
+            return None
+        state['keyboard'] = labels
+        
+        return build_keyboard(labels)
     
-    def start_timer(self, user_id, timer_name):
+    def _start_timer(self, user_id, timer_name):
         """Запуск таймера с проверкой существования в БД"""
+        state = self._get_state(user_id)
+        
         # Проверяем существование таймера
-        timer = self.timer_model.get_timer(user_id, timer_name)
+        timer = state['timers'].get(timer_name)
         if not timer:
             return f"Таймер '{timer_name}' не найден в базе данных"
         
         # Проверяем активные сессии для этого таймера
-        active_sessions = self.session_model.get_active_sessions(user_id)
+        active_sessions = state['active_sessions']
         for session in active_sessions:
             if session['timer_name'] == timer_name:
                 return f"Таймер '{timer_name}' уже запущен!"
         
-        # Запуск таймера
+        # Запуск таймера: проверки повторяются в самом INSERT, чтобы двойное нажатие
+        # не открыло вторую сессию
         now = datetime.now()
-        
-        # Сохраняем сессию в БД
-        session_id = self.session_model.start_session(user_id, timer_name, now)
+        session_id = self.session_model.start_session_if_idle(user_id, timer_name, now)
         if not session_id:
-            return f"Ошибка при запуске таймера '{timer_name}'"
+            self.state_cache.invalidate(user_id)
+            return f"Таймер '{timer_name}' уже запущен!"
+        
+        self.state_cache.update(user_id, lambda state: state['active_sessions'].append({
+            "id": session_id, "user_id": user_id, "timer_name": timer_name,
+            "start_time": now.isoformat(" "), "end_time": None, "duration_seconds": None
+        }))
         
         return f"Таймер '{timer_name}' запущен!"
     
-    def stop_timer(self, user_id, timer_name):
+    def _stop_timer(self, user_id, timer_name):
         """Остановка таймера с сохранением в БД"""
         # Проверяем существование таймера
-        timer = self.timer_model.get_timer(user_id, timer_name)
-        if not timer:
+        if timer_name not in self._get_state(user_id)['timers']:
             return f"Таймер '{timer_name}' не найден"
         
-        # Ищем активную сессию для этого таймера
-        active_sessions = self.session_model.get_active_sessions(user_id)
-        session_id = None
-        for session in active_sessions:
-            if session['timer_name'] == timer_name:
-                session_id = session['id']
-                break
-        
-        if not session_id:
+        # Закрываем сессию и обновляем итоги таймера и дня одной транзакцией
+        with self.timer_model.transaction():
+            result = self.session_model.stop_active_session(user_id, timer_name, datetime.now())
+            if result:
+                self.daily_total_model.refresh(user_id, timer_name, sessions=len(result['session_ids']))
+        if not result:
+            self.state_cache.invalidate(user_id)
             return f"Таймер '{timer_name}' не был запущен!"
         
-        # Останавливаем таймер
-        now = datetime.now()
-        
-        # Получаем время начала сессии из БД
-        session_data = self.session_model.read_one({"id": session_id})
-        if not session_data:
-            return f"Ошибка: не найдены данные сессии для таймера '{timer_name}'"
-        
-        start_time = datetime.fromisoformat(session_data['start_time'].replace('Z', '+00:00'))
-        delta = now - start_time
-        duration_seconds = delta.total_seconds()
-        
-        # Обновляем общее время в БД
-        self.timer_model.add_time_to_timer(user_id, timer_name, duration_seconds)
-        
-        # Завершаем сессию в БД
-        success = self.session_model.stop_session(session_id, now, duration_seconds)
-        if not success:
-            return f"Ошибка при остановке таймера '{timer_name}'"
-        
-        # Получаем актуальные данные из БД для отчета
-        updated_timer = self.timer_model.get_timer(user_id, timer_name)
-        total_seconds = updated_timer['total_seconds'] if updated_timer else 0
+        duration_seconds = result['duration_seconds']
+        total_seconds = result['total_seconds']
         hours = int(total_seconds // 3600)
         minutes = int((total_seconds % 3600) // 60)
         
+        def apply(state):
+            state['active_sessions'][:] = [
+                s for s in state['active_sessions'] if s['id'] not in result['session_ids']
+            ]
+            if timer_name in state['timers']:
+                state['timers'][timer_name]['total_seconds'] = total_seconds
+        self.state_cache.update(user_id, apply)
+        
         return (
             f"Таймер '{timer_name}' остановлен\n"
             f"Сессия: {duration_seconds/60:.1f} минут\n"
             f"Всего времени: {hours}h {minutes}m"
         )
     
-    def create_timer(self, user_id, key, task_id, timer_type):
+    def _create_timer(self, user_id, key, task_id, timer_type):
         """Создание таймера через модель"""
         success = self.timer_model.create_timer(user_id, key, task_id, timer_type)
+        self.state_cache.invalidate(user_id)
         if success:
             return f"Таймер '{key}' готов к запуску!"
         else:
             return f"Таймер '{key}' уже существует!"
     
-    def add_minutes(self, user_id, timer_name, minutes):
+    def _add_minutes(self, user_id, timer_name, minutes):
         """Добавление времени через модель"""
-        # Проверяем существование таймера
-        timer = self.timer_model.get_timer(user_id, timer_name)
-        if not timer:
-            return f"Таймер '{timer_name}' не найден"
-        
-        # Добавляем время через модель
+        # Добавляем время через модель, новый итог возвращается тем же запросом
         seconds_to_add = minutes * 60
-        self.timer_model.add_time_to_timer(user_id, timer_name, seconds_to_add)
+        with self.timer_model.transaction():
+            total_seconds = self.timer_model.add_time_to_timer(user_id, timer_name, seconds_to_add)
+            if total_seconds is not None:
+                self.daily_total_model.refresh(user_id, timer_name)
+        if total_seconds is None:
+            return f"Таймер '{timer_name}' не найден"
         
-        # Получаем актуальные данные для отчета
-        updated_timer = self.timer_model.get_timer(user_id, timer_name)
-        total_seconds = updated_timer['total_seconds'] if updated_timer else 0
         hours = int(total_seconds // 3600)
         minutes_total = int((total_seconds % 3600) // 60)
         
+        def apply(state):
+            if timer_name in state['timers']:
+                state['timers'][timer_name]['total_seconds'] = total_seconds
+        self.state_cache.update(user_id, apply)
+        
         return (
             f"К таймеру '{timer_name}' добавлено {minutes} минут\n"
             f"Всего времени: {hours}h {minutes_total}m"
         )
     
-    def delete_timer(self, user_id, timer_name):
+    def _delete_timer(self, user_id, timer_name):
         """Удаление таймера из БД"""
         # Проверяем существование таймера
         timer = self.timer_model.get_timer(user_id, timer_name)
         if not timer:
             return f"Таймер '{timer_name}' не найден"
         
-        # Если таймер активен, останавливаем его
-        active_sessions = self.session_model.get_active_sessions(user_id)
-        for session in active_sessions:
-            if session['timer_name'] == timer_name:
-                self.stop_timer(user_id, timer_name)
-                break
-        
-        # Удаляем сессии таймера
-        self.session_model.delete({"user_id": user_id, "timer_name": timer_name})
-        
-        # Удаляем сам таймер
-        self.timer_model.delete({"user_id": user_id, "name": timer_name})
+        # Остановка и удаление - одна транзакция: при сбое не останется осиротевших сессий
+        try:
+            with self.timer_model.transaction():
+                # Если таймер активен, останавливаем его
+                active_sessions = self.session_model.get_active_sessions(user_id)
+                for session in active_sessions:
+                    if session['timer_name'] == timer_name:
+                        self._stop_timer(user_id, timer_name)
+                        break
+                
+                # Удаляем сессии таймера
+                self.session_model.delete({"user_id": user_id, "timer_name": timer_name})
+                
+                # Удаляем сам таймер и его итоги за сегодня: итоги прошлых дней остаются
+                # для /week, /month и /stats (после архивирования других записей о них нет)
+                self.timer_model.delete({"user_id": user_id, "name": timer_name})
+                self.daily_total_model.delete({
+                    "user_id": user_id, "work_date": timer['work_date'], "timer_name": timer_name
+                })
+        finally:
+            self.state_cache.invalidate(user_id)
         
         return f"Таймер '{timer_name}' удален!"
     
-    def get_statistics(self, user_id):
+    def _get_statistics(self, user_id):
         """Получение статистики по сегодняшним таймерам пользователя"""
-        today_timers = self.timer_model.get_today_timers(user_id)
+        state = self._get_state(user_id)
+        today_timers = list(state['timers'].values())
         
         if not today_timers:
             return "На сегодня нет активных таймеров"
         
         stats = []
         total_day_seconds = 0
-        active_sessions = self.session_model.get_active_sessions(user_id)
+        active_sessions = state['active_sessions']
         
         # Создаем множество активных таймеров для быстрого поиска
         active_timer_names = {session['timer_name'] for session in active_sessions}
@@ -200,12 +270,18 @@ class TimerService:
         
         return "\n".join(result)
 
-    def clear_all_timers(self, user_id):
+    def _clear_all_timers(self, user_id):
         """Очистка всех таймеров пользователя (для команды старт)"""
         # Останавливаем все активные таймеры
-        active_sessions = self.session_model.get_active_sessions(user_id)
-        
-        for session in active_sessions:
-            self.stop_timer(user_id, session['timer_name'])
+        active_sessions = list(self._get_state(user_id)['active_sessions'])
+        
+        if active_sessions:
+            try:
+                with self.timer_model.transaction():
+                    for session in active_sessions:
+                        self._stop_timer(user_id, session['timer_name'])
+            except Exception:
+                self.state_cache.invalidate(user_id)
+                raise
         
         return "Все таймеры остановлены и кнопки очищены"
\ No newline at end of file
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+
+class UserStateCache:
+    """LRU кэш состояния пользователей на текущий день.
+
+    Запись живёт до смены дня. Поколение (generation) пользователя растёт при
+    каждом изменении, чтобы загрузка из БД, начатая до записи, не положила в
+    кэш устаревшие данные.
+    """
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (день, состояние)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != date.today():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user_id, state, generation):
+        """Сохранение загруженного состояния, если с начала загрузки ничего не менялось"""
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._entries[user_id] = (date.today(), state)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._generations.pop(evicted, None)
+
+    def update(self, user_id, mutate):
+        """Write-through: применяет изменение к закэшированному состоянию"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == date.today():
+                mutate(entry[1])
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
\ No newline at end of file
@@ -0,0 +1,119 @@
+import asyncio
+import hmac
+import json
+import os
+import signal
+import time
+from telegram import Update
+from telegram.ext import Application
+from Class.HttpServer import HttpServer
+from Class.Singleton import Singleton
+
+class WebhookService(Singleton):
+    """Приём обновлений Telegram через webhook вместо long polling.
+
+    Локальный HTTP listener ставит пришедшие Update в очередь приложения.
+    Снаружи его закрывает reverse proxy с TLS, адрес для Telegram - WEBHOOK_URL.
+    Без WEBHOOK_SECRET режим не запускается: принимаются только запросы с этим
+    секретом в заголовке X-Telegram-Bot-Api-Secret-Token.
+    """
+
+    def __init__(self):
+        self.url = os.getenv('WEBHOOK_URL')
+        self.path = os.getenv('WEBHOOK_PATH', '/telegram')
+        self.secret = os.getenv('WEBHOOK_SECRET')
+        self.max_connections = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+        self.server = HttpServer(os.getenv('WEBHOOK_LISTEN', '127.0.0.1'), int(os.getenv('WEBHOOK_PORT', 8080)))
+        self.server.route('POST', self.path, self.handle_update)
+        self.server.route('GET', '/health', self.health)
+        self.app = None
+        self.started_at = None
+        self.received = 0
+        self.rejected = 0
+
+    async def handle_update(self, headers, body):
+        """POST от Telegram: проверка секрета и постановка Update в очередь"""
+        token = headers.get('x-telegram-bot-api-secret-token', '')
+        if not self.secret or not hmac.compare_digest(token.encode(), self.secret.encode()):
+            self.rejected += 1
+            return 403, 'text/plain', b'forbidden'
+
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except Exception as e:
+            self.rejected += 1
+            print(f"⚠️ Некорректное обновление от webhook: {e}")
+            return 400, 'text/plain', b'bad update'
+
+        self.received += 1
+        await self.app.update_queue.put(update)
+        return 200, 'text/plain', b'ok'
+
+    async def health(self, headers, body):
+        running = self.app is not None and self.app.running
+        payload = {
+            'status': 'ok' if running else 'starting',
+            'uptime_seconds': round(time.monotonic() - self.started_at, 1) if self.started_at else 0,
+            'update_queue': self.app.update_queue.qsize() if self.app else 0,
+            'received': self.received,
+            'rejected': self.rejected,
+        }
+        processor = self.app.update_processor if self.app else None
+        if hasattr(processor, 'stats'):
+            payload['updates'] = processor.stats()
+        return 200 if running else 503, 'application/json', json.dumps(payload).encode()
+
+    def run(self, app: Application) -> bool:
+        """Блокирующий запуск бота в режиме webhook (аналог app.run_polling)"""
+        if not self.secret:
+            # Без секрета любой, кто достучится до порта, может подсовывать боту обновления
+            print("Ошибка: для BOT_MODE=webhook нужен WEBHOOK_SECRET в .env файле")
+            return False
+        print("Бот запущен (webhook)...")
+        asyncio.run(self._run(app))
+        return True
+
+    async def _run(self, app: Application):
+        self.app = app
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: остаётся KeyboardInterrupt
+                pass
+
+        # Тот же порядок запуска и остановки, что у run_polling, включая post_init/post_shutdown
+        await app.initialize()
+        try:
+            if app.post_init:
+                await app.post_init(app)
+            await self.server.start()
+            await app.start()
+            self.started_at = time.monotonic()
+
+            if self.url:
+                await app.bot.set_webhook(
+                    url=self.url,
+                    secret_token=self.secret,
+                    allowed_updates=Update.ALL_TYPES,
+                    max_connections=self.max_connections,
+                )
+            else:
+                print("⚠️ WEBHOOK_URL не задан, webhook в Telegram не регистрируется")
+            print(f"🌐 Webhook слушает http://{self.server.host}:{self.server.port}{self.path}")
+
+            try:
+                await stop.wait()
+            except asyncio.CancelledError:
+                pass
+        finally:
+            await self.server.stop()
+            if app.running:
+                await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+            await app.shutdown()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
\ No newline at end of file
@@ -1,19 +1,38 @@
+# Первым импортом: отсчёт времени запуска начинается до загрузки telegram и контроллеров
+from Class.StartupTimer import startup
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
+
+# Переменные окружения загружаются до импорта модулей проекта: часть настроек
+# (QueryLog, пул потоков БД, кэш состояния) читается при их создании
+load_dotenv()
+
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
 from Controllers.TimerController import TimerController
 from Controllers.ReportController import ReportController
+from Controllers.StatisticsController import StatisticsController
 from Services.B24Service import B24Service
-
-# Загружаем переменные окружения
-load_dotenv()
+from Services.B24TokenService import B24TokenService
+from Services.OutboxService import OutboxService
+from Services.MetricsService import MetricsService
+from Services.RetentionService import RetentionService
+from Class.Database import Database
+from Class.Executor import db_executor
+from Class.Schema import Schema
+from Class.UpdateProcessor import UserOrderedUpdateProcessor
+from Class.SqlitePersistence import SqlitePersistence
 
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# polling - long polling, webhook - приём обновлений через локальный HTTP listener
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
 
 # Создаем контроллеры
 timer_controller = TimerController()
 report_controller = ReportController()
+statistics_controller = StatisticsController()
 
 async def handle_all_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Универсальный обработчик для диалогов и кнопок"""
@@ -48,15 +67,67 @@ async def handle_all_messages(update: Update, context: ContextTypes.DEFAULT_TYPE
     # Если сообщение не распознано
     await timer_controller.send_response(update, "Команда не распознана")
 
+async def post_init(app: Application):
+    """Фоновые задачи, которые живут в event loop бота"""
+    startup.mark('initialize')
+    # Токены Битрикса обновляются заранее по расписанию, а при необходимости - лениво при запросе.
+    # Запуск бота их не ждёт: медленный Битрикс не задерживает приём обновлений
+    tokens = B24TokenService.instance()
+    outbox = OutboxService.instance()
+    if app.job_queue:
+        app.job_queue.run_repeating(tokens.refresh_job, interval=tokens.margin, first=0)
+        outbox.schedule(app.job_queue)
+        # Перенос старой истории в архив раз в сутки (если задан RETENTION_DAYS)
+        RetentionService.instance().schedule(app.job_queue)
+    else:
+        app.create_task(tokens.refresh_job())
+        print("⚠️ JobQueue недоступна (нужен python-telegram-bot[job-queue]), токены обновляются только при запросах, очередь Битрикса - только после отчёта")
+    
+    # Независимые шаги запуска - одновременно: возврат в очередь отправок, прерванных
+    # прошлой остановкой, и метрики Prometheus на локальном порту (если задан METRICS_PORT)
+    await asyncio.gather(outbox.recover(), MetricsService.instance().start(app))
+    startup.mark('post_init')
+    startup.report()
+
+async def shutdown(app: Application):
+    """Освобождение ресурсов при остановке бота"""
+    await MetricsService.instance().stop()
+    await B24Service.close()
+    # БД - последней: дожидаемся запросов в пуле потоков, затем закрываем соединения
+    db_executor.shutdown()
+    Database.get().close_all()
+
+def retention(args):
+    """Архивирование истории без запуска бота: python bot.py retention [дней]"""
+    Schema.bootstrap()
+    days = int(args[0]) if args else None
+    if not asyncio.run(RetentionService.instance().run(days)):
+        print("Укажите срок хранения: python bot.py retention <дней> или RETENTION_DAYS в .env")
+
 def main():
+    if sys.argv[1:2] == ['retention']:
+        retention(sys.argv[2:])
+        return
+    
     if not TOKEN:
         print("Ошибка: TELEGRAM_BOT_TOKEN не найден в .env файле")
         return
     
-    # Обновляем токены Битрикса
-    B24Service().refreshTokens()
+    # Схема приведена к актуальной версии при создании контроллеров (их модели), здесь - проверка
+    Schema.bootstrap()
+    startup.mark('импорт')
     
-    app = Application.builder().token(TOKEN).build()
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        # Разные пользователи обрабатываются параллельно, сообщения одного - по порядку
+        .concurrent_updates(UserOrderedUpdateProcessor())
+        # Состояние диалога отчёта переживает перезапуск бота
+        .persistence(SqlitePersistence())
+        .post_init(post_init)
+        .post_shutdown(shutdown)
+        .build()
+    )
     
     # Регистрируем обработчики команд
     app.add_handler(CommandHandler("start", timer_controller.start))
@@ -64,12 +135,22 @@ def main():
     app.add_handler(CommandHandler("plus", timer_controller.add_minutes))
     app.add_handler(CommandHandler("delete", timer_controller.delete_timer))
     app.add_handler(CommandHandler("diff", timer_controller.diff_minutes))
+    app.add_handler(CommandHandler("week", statistics_controller.week))
+    app.add_handler(CommandHandler("month", statistics_controller.month))
+    app.add_handler(CommandHandler("stats", statistics_controller.range))
+    app.add_handler(CommandHandler("export", statistics_controller.export))
     
     # Единый обработчик для всех сообщений
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_all_messages))
+    startup.mark('сборка')
     
-    print("Бот запущен...")
-    app.run_polling()
+    if BOT_MODE == 'webhook':
+        # Импорт здесь: режим polling не должен зависеть от HTTP сервера
+        from Services.WebhookService import WebhookService
+        WebhookService.instance().run(app)
+    else:
+        print("Бот запущен...")
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file